@@ -0,0 +1,199 @@
+"""
+Times the entry points of the hooks on a synthetic tree of source files.
+
+Each hook runs in a fresh subprocess, on a fresh copy of the tree as several of them modify files,
+so that its peak RSS is measured in isolation. Only the call to its main() function is timed.
+
+Usage: python -m benchmarks.run --files-count 5000 --file-size 8192 --json results.json
+"""
+# subprocess only runs the current Python interpreter, with a list of arguments and no shell:
+import argparse, contextlib, importlib, json, os, shutil, subprocess, sys, tempfile, time  # nosec B404
+
+from benchmarks.synthetic_repo import LICENSE_FILENAME, RepoSpec, generate_repository
+
+# Hook name -> (module, arguments preceding the filenames):
+HOOKS = {
+    "insert_license": (
+        "pre_commit_hooks.insert_license",
+        ["--license-filepath", LICENSE_FILENAME],
+    ),
+    "forbid_crlf": ("pre_commit_hooks.forbid_crlf", []),
+    "remove_crlf": ("pre_commit_hooks.remove_crlf", []),
+    "forbid_tabs": ("pre_commit_hooks.forbid_tabs", []),
+    "remove_tabs": ("pre_commit_hooks.remove_tabs", ["--whitespaces-count", "4"]),
+    "chmod": ("pre_commit_hooks.chmod", ["644"]),
+    "multi_check": (
+        "pre_commit_hooks.multi_check",
+        ["--crlf", "--tabs", "--license", "--license-filepath", LICENSE_FILENAME],
+    ),
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files-count", type=int, default=2000)
+    parser.add_argument("--file-size", type=int, default=4096, help="in bytes")
+    parser.add_argument("--license-share", type=float, default=0.5)
+    parser.add_argument("--crlf-share", type=float, default=0.1)
+    parser.add_argument("--tabs-share", type=float, default=0.1)
+    parser.add_argument("--latin1-share", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--hooks",
+        type=lambda value: value.split(","),
+        default=list(HOOKS),
+        help=f"comma-separated list among: {','.join(HOOKS)}",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="number of runs per hook, the fastest one is reported",
+    )
+    parser.add_argument("--json", help="file to store the results into")
+    parser.add_argument(
+        "--baseline",
+        help="results of a previous run, stored with --json, to compare against",
+    )
+    parser.add_argument(
+        "--max-slowdown",
+        type=float,
+        default=0.2,
+        help="relative slowdown compared to the baseline above which the run fails (default: 0.2)",
+    )
+    args = parser.parse_args(argv)
+    unknown_hooks = set(args.hooks) - set(HOOKS)
+    if unknown_hooks:
+        parser.error(f"unknown hooks: {', '.join(sorted(unknown_hooks))}")
+    spec = RepoSpec(
+        files_count=args.files_count,
+        file_size=args.file_size,
+        license_share=args.license_share,
+        crlf_share=args.crlf_share,
+        tabs_share=args.tabs_share,
+        latin1_share=args.latin1_share,
+        seed=args.seed,
+    )
+    results = {"spec": spec._asdict(), "hooks": {}}
+    with tempfile.TemporaryDirectory(prefix="pre-commit-hooks-bench-") as tmp_dir:
+        template_dir = os.path.join(tmp_dir, "template")
+        os.mkdir(template_dir)
+        filenames = generate_repository(template_dir, spec)
+        total_size = sum(
+            os.path.getsize(os.path.join(template_dir, filename))
+            for filename in filenames
+        )
+        print(
+            f"Generated {len(filenames)} files, {total_size / 1e6:.1f} MB in total",
+            file=sys.stderr,
+        )
+        for hook in args.hooks:
+            module, hook_args = HOOKS[hook]
+            runs = []
+            for _ in range(args.repeat):
+                run_dir = os.path.join(tmp_dir, "run")
+                shutil.copytree(template_dir, run_dir)
+                runs.append(_run_hook(module, hook_args + filenames, run_dir))
+                shutil.rmtree(run_dir)
+            seconds = min(run["seconds"] for run in runs)
+            results["hooks"][hook] = {
+                "seconds": seconds,
+                "files_per_second": len(filenames) / seconds,
+                "mb_per_second": total_size / 1e6 / seconds,
+                "peak_rss_mb": runs[0]["peak_rss_mb"]
+                and max(run["peak_rss_mb"] for run in runs),
+            }
+    _print_results(results["hooks"])
+    if args.json:
+        with open(args.json, "w", encoding="utf8") as json_file:
+            json.dump(results, json_file, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf8") as json_file:
+            baseline = json.load(json_file)
+        return _compare_to_baseline(results, baseline, args.max_slowdown)
+    return 0
+
+
+def _run_hook(module, argv, cwd):
+    """
+    Runs the main() function of a hook module in a subprocess, through run_child
+    :return: a dict with the duration of this main() call and the peak RSS of the subprocess
+    """
+    output = subprocess.run(  # nosec B603
+        [sys.executable, "-m", "benchmarks.run", "--child"],
+        input=json.dumps({"module": module, "argv": argv}),
+        cwd=cwd,
+        env=dict(os.environ, PYTHONPATH=_pythonpath()),
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def _pythonpath():
+    project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.pathsep.join(filter(None, (project_dir, os.environ.get("PYTHONPATH"))))
+
+
+def run_child():
+    """
+    Entry point of the subprocesses: reads the hook to run from stdin,
+    and prints the measurements as a JSON line on stdout.
+    """
+    params = json.load(sys.stdin)
+    hook_main = importlib.import_module(params["module"]).main
+    with open(os.devnull, "w", encoding="utf8") as devnull, contextlib.redirect_stdout(
+        devnull
+    ):
+        start = time.perf_counter()
+        hook_main(params["argv"])
+        seconds = time.perf_counter() - start
+    print(json.dumps({"seconds": seconds, "peak_rss_mb": _peak_rss_mb()}))
+
+
+def _peak_rss_mb():
+    try:
+        import resource  # pylint: disable=import-outside-toplevel
+    except ImportError:  # on Windows
+        return None
+    # Worker processes, like those of insert_license --jobs, are accounted for too:
+    max_rss = max(
+        resource.getrusage(who).ru_maxrss
+        for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN)
+    )
+    # ru_maxrss is in bytes on macOS, and in kilobytes on Linux:
+    return max_rss / 1e6 if sys.platform == "darwin" else max_rss / 1e3
+
+
+def _print_results(hooks_results):
+    print(f"{'hook':<16}{'seconds':>10}{'files/s':>12}{'MB/s':>10}{'peak RSS MB':>14}")
+    for hook, result in hooks_results.items():
+        peak_rss_mb = result["peak_rss_mb"]
+        print(
+            f"{hook:<16}{result['seconds']:>10.3f}{result['files_per_second']:>12.0f}"
+            f"{result['mb_per_second']:>10.1f}{'n/a' if peak_rss_mb is None else f'{peak_rss_mb:.1f}':>14}"
+        )
+
+
+def _compare_to_baseline(results, baseline, max_slowdown):
+    if results["spec"] != baseline["spec"]:
+        print("The baseline was measured on a different synthetic tree:")
+        print(f"  {baseline['spec']}")
+        return 2
+    regressions = []
+    for hook, result in results["hooks"].items():
+        if hook not in baseline["hooks"]:
+            continue
+        slowdown = result["seconds"] / baseline["hooks"][hook]["seconds"] - 1
+        if slowdown > max_slowdown:
+            regressions.append(hook)
+            print(f"REGRESSION: {hook} is {slowdown:.0%} slower than the baseline")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--child"]:
+        run_child()
+    else:
+        sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,84 @@
+import os, random
+from collections import namedtuple
+
+LICENSE_FILENAME = "LICENSE.txt"
+LICENSE_LINES = (
+    "Copyright (C) 2024 Benchmark Corp.",
+    "Licensed under the Apache License, Version 2.0 (the 'License');",
+    "you may not use this file except in compliance with the License.",
+)
+FILES_PER_DIRECTORY = 100
+
+RepoSpec = namedtuple(
+    "RepoSpec",
+    (
+        "files_count",
+        "file_size",
+        "license_share",
+        "crlf_share",
+        "tabs_share",
+        "latin1_share",
+        "seed",
+    ),
+    defaults=(0.5, 0.1, 0.1, 0.05, 0),
+)
+
+
+def generate_repository(root, spec):
+    """
+    Creates a tree of synthetic Python source files, and the license file they are checked against.
+    The share of files having each trait is drawn independently from a seeded random generator,
+    so that the same spec always generates the same tree.
+    :param root: directory in which the tree is created
+    :param spec: RepoSpec
+    :return: paths of the generated source files, relative to root
+    """
+    # Not for security purposes, only to generate reproducible trees:
+    rng = random.Random(spec.seed)  # nosec B311
+    with open(
+        os.path.join(root, LICENSE_FILENAME), "w", encoding="utf8"
+    ) as license_file:
+        license_file.write("\n".join(LICENSE_LINES) + "\n")
+    filenames = []
+    for index in range(spec.files_count):
+        dirname = os.path.join(
+            f"pkg{index // (10 * FILES_PER_DIRECTORY)}",
+            f"sub{index // FILES_PER_DIRECTORY % 10}",
+        )
+        os.makedirs(os.path.join(root, dirname), exist_ok=True)
+        filename = os.path.join(dirname, f"module_{index}.py")
+        content = _source_file_content(
+            rng,
+            spec.file_size,
+            with_license=rng.random() < spec.license_share,
+            with_tabs=rng.random() < spec.tabs_share,
+            with_latin1=rng.random() < spec.latin1_share,
+        )
+        if rng.random() < spec.crlf_share:
+            content = content.replace(b"\n", b"\r\n")
+        with open(os.path.join(root, filename), "wb") as src_file:
+            src_file.write(content)
+        filenames.append(filename)
+    return filenames
+
+
+def _source_file_content(rng, file_size, with_license, with_tabs, with_latin1):
+    lines: list = []
+    if with_license:
+        lines.extend(f"# {line}".encode("utf8") for line in LICENSE_LINES)
+        lines.append(b"")
+    if with_latin1:
+        lines.append("# Auteur : Benoît Lefèvre, équipe données".encode("ISO-8859-1"))
+    indent = b"\t" if with_tabs else b"    "
+    size = sum(len(line) + 1 for line in lines)
+    while size < file_size:
+        number = rng.randrange(10**6)
+        block = (
+            b"",
+            b"def function_%d(value):" % number,
+            indent + b"result = value * %d + len(str(value))" % rng.randrange(100),
+            indent + b"return result  # %x" % rng.getrandbits(64),
+        )
+        lines.extend(block)
+        size += sum(len(line) + 1 for line in block)
+    return b"\n".join(lines) + b"\n"
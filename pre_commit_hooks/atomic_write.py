@@ -0,0 +1,94 @@
+import contextlib, os, shutil, tempfile
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+@contextlib.contextmanager
+def atomic_write(filename, fsync=False):
+    """
+    Yields a binary file object, whose content replaces the file `filename` on exit.
+    Data is written to a temporary file in the same directory, that is atomically renamed
+    once complete, so that an interrupted run never leaves a truncated file behind.
+    Permissions of the original file are preserved, and symlinks are written through.
+    A file that did not exist yet is created readable & writable by its owner only.
+    :param fsync: whether to flush the file, then its directory entry, to the disk before returning
+    """
+    filename = os.path.realpath(filename)
+    file_descriptor, tmp_filepath = tempfile.mkstemp(
+        dir=os.path.dirname(filename),
+        prefix=f".{os.path.basename(filename)}.",
+        suffix=".tmp",
+    )
+    try:
+        with os.fdopen(file_descriptor, "wb") as tmp_file:
+            yield tmp_file
+            if fsync:
+                tmp_file.flush()
+                os.fsync(tmp_file.fileno())
+        with contextlib.suppress(FileNotFoundError):
+            shutil.copymode(filename, tmp_filepath)
+        os.replace(tmp_filepath, filename)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp_filepath)
+        raise
+    if fsync:
+        _fsync_directory(os.path.dirname(filename))
+
+
+def splice_file(filename, offset, inserted=b"", removed_size=0, fsync=False):
+    """
+    Atomically replaces `removed_size` bytes at `offset` in a file by the `inserted` ones.
+    The rest of the file is copied as is, without being loaded in memory nor split into lines.
+    """
+    with atomic_write(filename, fsync=fsync) as tmp_file, open(
+        filename, "rb"
+    ) as src_file:
+        copy_bytes(src_file, tmp_file, offset)
+        tmp_file.write(inserted)
+        src_file.seek(offset + removed_size)
+        copy_to_end(src_file, tmp_file)
+
+
+def copy_bytes(src_file, dst_file, size, chunk_size=COPY_CHUNK_SIZE):
+    """
+    Copies at most `size` bytes, from the current position of src_file
+    """
+    while size > 0:
+        chunk = src_file.read(min(size, chunk_size))
+        if not chunk:
+            break
+        dst_file.write(chunk)
+        size -= len(chunk)
+
+
+def copy_to_end(src_file, dst_file):
+    """
+    Copies the rest of src_file, from its current position.
+    When possible, data is transferred by the kernel, without going through user space.
+    """
+    if hasattr(os, "sendfile"):
+        dst_file.flush()
+        offset = src_file.tell()
+        try:
+            while True:
+                sent = os.sendfile(
+                    dst_file.fileno(), src_file.fileno(), offset, COPY_CHUNK_SIZE
+                )
+                if not sent:
+                    return
+                offset += sent
+        except OSError:  # e.g. on macOS, where the destination must be a socket
+            src_file.seek(offset)
+    shutil.copyfileobj(src_file, dst_file, COPY_CHUNK_SIZE)
+
+
+def _fsync_directory(dirname):
+    # Directories can not be opened on some platforms, like Windows:
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    dir_fd = os.open(dirname, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
@@ -1,4 +1,5 @@
-import argparse, os, sys
+# subprocess only runs git, found in the PATH, with lists of arguments and no shell:
+import argparse, collections, contextlib, itertools, os, re, subprocess, sys  # nosec B404
 
 # pylint: disable=unused-wildcard-import, wildcard-import
 from stat import *
@@ -24,36 +25,261 @@ SUPPORTED_BITS = (
     | S_IXOTH  # execute by others
 )
 
+# Whether files can be accessed relatively to an open directory on this platform:
+DIR_FD_SUPPORTED = (
+    hasattr(os, "O_DIRECTORY")
+    and os.stat in os.supports_dir_fd
+    and os.chmod in os.supports_dir_fd
+)
+
+# Bits affected by each "who" letter of symbolic modes:
+WHO_BITS = {
+    "u": S_ISUID | S_IRWXU,
+    "g": S_ISGID | S_IRWXG,
+    "o": S_ISVTX | S_IRWXO,
+    "a": SUPPORTED_BITS,
+}
+# Bits set by each permission letter of symbolic modes, before being restricted to "who":
+PERM_BITS = {
+    "r": S_IRUSR | S_IRGRP | S_IROTH,
+    "w": S_IWUSR | S_IWGRP | S_IWOTH,
+    "x": S_IXUSR | S_IXGRP | S_IXOTH,
+    "s": S_ISUID | S_ISGID,
+    "t": S_ISVTX,
+}
+SYMBOLIC_CLAUSE_REGEX = re.compile(r"([ugoa]*)((?:[-+=][rwxst]*)+)")
+SYMBOLIC_OPERATION_REGEX = re.compile(r"([-+=])([rwxst]*)")
+
+# Modes of regular files in the git index, that only record whether they are executable:
+GIT_REGULAR_FILE_MODE = 0o100644
+GIT_EXECUTABLE_FILE_MODE = 0o100755
+
+# New modes are computed as: (current_mode & and_mask) | or_mask
+ModeTransform = collections.namedtuple("ModeTransform", ["and_mask", "or_mask"])
+
+
+def compile_mode(perms):
+    """
+    Compiles octal permissions, or a symbolic mode like chmod ones (e.g. "+x" or "u=rw,go=r"),
+    into a ModeTransform.
+    Symbolic modes without "who" letters apply to all, regardless of the umask,
+    and modes that depend on the current permissions ("X", "g=u"...) are not supported.
+    :raise ValueError: if the permissions are invalid
+    """
+    if perms[:1].isdigit():
+        return ModeTransform(and_mask=0, or_mask=int(perms, 8))
+    transform = ModeTransform(and_mask=SUPPORTED_BITS, or_mask=0)
+    for clause in perms.split(","):
+        match = SYMBOLIC_CLAUSE_REGEX.fullmatch(clause)
+        if not match:
+            raise ValueError(f"invalid symbolic mode: '{clause}'")
+        who_bits = 0
+        for who in match.group(1) or "a":
+            who_bits |= WHO_BITS[who]
+        for operator, perm_letters in SYMBOLIC_OPERATION_REGEX.findall(match.group(2)):
+            perm_bits = 0
+            for perm in perm_letters:
+                perm_bits |= PERM_BITS[perm]
+            perm_bits &= who_bits
+            if operator == "+":
+                operation = ModeTransform(and_mask=SUPPORTED_BITS, or_mask=perm_bits)
+            elif operator == "-":
+                operation = ModeTransform(
+                    and_mask=SUPPORTED_BITS & ~perm_bits, or_mask=0
+                )
+            else:
+                operation = ModeTransform(
+                    and_mask=SUPPORTED_BITS & ~who_bits, or_mask=perm_bits
+                )
+            transform = ModeTransform(
+                and_mask=transform.and_mask & operation.and_mask,
+                or_mask=(transform.or_mask & operation.and_mask) | operation.or_mask,
+            )
+    return transform
+
 
 def main(argv=None):
     parser = argparse.ArgumentParser()
     parser.add_argument(
-        "perms", type=str, help="Octal permissions to set on target files"
+        "perms",
+        type=str,
+        nargs="?",
+        help="Octal permissions to set on target files, or symbolic mode to apply (e.g. +x, -x or u=rw,go=r)",
     )
     parser.add_argument("filenames", nargs="*", help="filenames to check")
-    args = parser.parse_args(argv)
+    parser.add_argument(
+        "--git-index",
+        action="store_true",
+        help="Update the modes of files staged in the git index, instead of their permissions in the worktree",
+    )
+    args, unknown_args = parser.parse_known_args(argv)
+    # Symbolic modes starting with a dash, like "-x", are taken for unknown options by argparse:
+    if len(unknown_args) == 1 and not unknown_args[0].startswith("--"):
+        if args.perms is not None:
+            args.filenames.insert(0, args.perms)
+        args.perms = unknown_args[0]
+    elif unknown_args:
+        parser.error(f"unrecognized arguments: {' '.join(unknown_args)}")
+    if args.perms is None:
+        parser.error("the following arguments are required: perms")
     try:
-        # TODO: add support for +rwx syntax
-        new_mode = int(args.perms, 8)
+        mode_transform = compile_mode(args.perms)
     except ValueError as error:
-        print(f"Incorrect octal permissions provided in configuration: {error}")
+        print(f"Incorrect permissions provided in configuration: {error}")
         return 2
-    result = 0
+    if args.git_index:
+        return fix_git_index_modes(args.filenames, mode_transform)
     if sys.platform == "win32":
         print("This hook does nothing when executed on Windows")
-    else:
-        for filename in args.filenames:
-            current_mode = os.stat(filename).st_mode
-            # We ignore S_IFREG and other similar unsupported bits:
-            current_mode &= SUPPORTED_BITS
-            if current_mode != new_mode:
-                print(
-                    f"Fixing file permissions on {filename}:"
-                    f" 0o{current_mode:o} -> 0o{new_mode:o}"
-                )
-                os.chmod(filename, new_mode)
-                result = 1
-    return result
+        return 0
+    return fix_permissions(args.filenames, mode_transform)
+
+
+def fix_permissions(filenames, mode_transform):
+    """
+    Files are grouped by directory, and every directory is opened once,
+    so that each file is then accessed relatively to it, without resolving its full path again.
+    As with the chmod command, symlinks are followed.
+    Changes are reported in the order of the filenames provided, once all files have been processed.
+    :return: 1 if the permissions of some files were changed, 0 otherwise
+    """
+    messages = []
+    try:
+        for dirname, indexed_filenames in _group_by_directory(filenames).items():
+            with _open_directory(dirname) as dir_fd:
+                for index, filename in indexed_filenames:
+                    path = filename if dir_fd is None else os.path.basename(filename)
+                    current_mode = os.stat(path, dir_fd=dir_fd).st_mode
+                    # We ignore S_IFREG and other similar unsupported bits:
+                    current_mode &= SUPPORTED_BITS
+                    new_mode = (
+                        current_mode & mode_transform.and_mask
+                    ) | mode_transform.or_mask
+                    if current_mode != new_mode:
+                        os.chmod(path, new_mode, dir_fd=dir_fd)
+                        messages.append(
+                            (
+                                index,
+                                f"Fixing file permissions on {filename}:"
+                                f" 0o{current_mode:o} -> 0o{new_mode:o}",
+                            )
+                        )
+    finally:
+        for _, message in sorted(messages):
+            print(message)
+    return 1 if messages else 0
+
+
+def fix_git_index_modes(filenames, mode_transform):
+    """
+    Updates the modes of the files staged in the git index:
+    the modes of all files are read with a single git command,
+    and those to change are updated with at most one more command per executable bit value.
+    As git only records the executable bit of the owner, other bits are ignored.
+    Files that are not staged, symlinks and submodules are left untouched.
+    Unless git ignores the executable bit in the worktree (core.fileMode=false),
+    the permissions of the updated files are also fixed in the worktree,
+    so that it does not show a mode change that was not staged.
+    :return: 0, as the fixed modes are already staged for the commit in progress
+    """
+    staged_modes = _git_staged_modes(filenames)
+    filenames_per_chmod_flag: dict[str, list[str]] = {"+x": [], "-x": []}
+    for filename in filenames:
+        staged_mode = staged_modes.get(os.path.normpath(filename))
+        if staged_mode not in (GIT_REGULAR_FILE_MODE, GIT_EXECUTABLE_FILE_MODE):
+            continue
+        new_mode = (
+            staged_mode & SUPPORTED_BITS & mode_transform.and_mask
+        ) | mode_transform.or_mask
+        new_staged_mode = (
+            GIT_EXECUTABLE_FILE_MODE if new_mode & S_IXUSR else GIT_REGULAR_FILE_MODE
+        )
+        if new_staged_mode != staged_mode:
+            print(
+                f"Fixing staged file mode of {filename}:"
+                f" {staged_mode:o} -> {new_staged_mode:o}"
+            )
+            chmod_flag = "+x" if new_staged_mode == GIT_EXECUTABLE_FILE_MODE else "-x"
+            filenames_per_chmod_flag[chmod_flag].append(filename)
+    for chmod_flag, filenames_to_update in filenames_per_chmod_flag.items():
+        if filenames_to_update:
+            subprocess.run(  # nosec B603
+                ["git", "update-index", f"--chmod={chmod_flag}", "--"]
+                + filenames_to_update,
+                check=True,
+            )
+    if _git_file_mode_enabled():
+        fix_permissions(
+            list(itertools.chain(*filenames_per_chmod_flag.values())), mode_transform
+        )
+    return 0
+
+
+def _git_file_mode_enabled():
+    """
+    :return: whether git compares the executable bit of files in the worktree with the one in the index
+    """
+    output = subprocess.run(  # nosec B603 B607
+        ["git", "config", "--bool", "core.fileMode"],
+        check=False,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    ).stdout
+    return output.strip() != "false"  # git defaults to true when not configured
+
+
+def _git_staged_modes(filenames):
+    """
+    :return: the modes of the files in the git index, per normalized path relative to the current directory
+    """
+    if not filenames:
+        return {}
+    output = subprocess.run(  # nosec B603
+        ["git", "--literal-pathspecs", "ls-files", "--stage", "-z", "--"]
+        + list(filenames),
+        check=True,
+        stdout=subprocess.PIPE,
+    ).stdout
+    staged_modes = {}
+    for entry in output.split(b"\0"):
+        if entry:
+            # Format: <mode> <object> <stage>\t<file>
+            metadata, path = entry.split(b"\t", 1)
+            staged_modes[os.path.normpath(os.fsdecode(path))] = int(
+                metadata.split(b" ", 1)[0], 8
+            )
+    return staged_modes
+
+
+def _group_by_directory(filenames):
+    """
+    Returns the (index, filename) pairs of the files in each directory
+    """
+    filenames_per_dir = collections.defaultdict(list)
+    for index, filename in enumerate(filenames):
+        filenames_per_dir[os.path.dirname(filename)].append((index, filename))
+    return filenames_per_dir
+
+
+@contextlib.contextmanager
+def _open_directory(dirname):
+    """
+    Yields a file descriptor of the directory,
+    or None if paths have to be resolved from the current directory instead.
+    """
+    try:
+        dir_fd = (
+            os.open(dirname or ".", os.O_RDONLY | os.O_DIRECTORY)
+            if DIR_FD_SUPPORTED
+            else None
+        )
+    except OSError:  # e.g. a directory that can be traversed but not read
+        dir_fd = None
+    try:
+        yield dir_fd
+    finally:
+        if dir_fd is not None:
+            os.close(dir_fd)
 
 
 if __name__ == "__main__":
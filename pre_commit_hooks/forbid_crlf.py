@@ -1,11 +1,27 @@
 import argparse, sys
 
+# Files are scanned by chunks of this size, so that memory usage does not depend on their size:
+CHUNK_SIZE = 64 * 1024
+
 
 def contains_crlf(filename):
     with open(filename, mode="rb") as file_checked:
-        for line in file_checked.readlines():
-            if line.endswith(b"\r\n"):
-                return True
+        return chunks_contain_crlf(iter(lambda: file_checked.read(CHUNK_SIZE), b""))
+
+
+def chunks_contain_crlf(chunks):
+    """
+    Returns True if a CRLF end-line is found in those consecutive chunks of bytes,
+    even if split between two chunks. No more chunk is consumed once one is found.
+    """
+    previous_chunk_ends_with_cr = False
+    for chunk in chunks:
+        if b"\r\n" in chunk or (
+            previous_chunk_ends_with_cr and chunk.startswith(b"\n")
+        ):
+            return True
+        if chunk:
+            previous_chunk_ends_with_cr = chunk.endswith(b"\r")
     return False
 
 
@@ -1,9 +1,27 @@
-import argparse, sys
+import argparse, mmap, os, stat, sys
+
+# Size of the chunks read when files can not be memory-mapped:
+CHUNK_SIZE = 64 * 1024
 
 
 def contains_tabs(filename):
     with open(filename, mode="rb") as file_checked:
-        return b"\t" in file_checked.read()
+        file_stat = os.fstat(file_checked.fileno())
+        # Empty files, pipes and other special files can not be memory-mapped:
+        if stat.S_ISREG(file_stat.st_mode) and file_stat.st_size > 0:
+            try:
+                with mmap.mmap(
+                    file_checked.fileno(), 0, access=mmap.ACCESS_READ
+                ) as mapped_file:
+                    # Searched without copying the file content, and up to the first tab only:
+                    return mapped_file.find(b"\t") != -1
+            except (OSError, ValueError):  # e.g. file systems without mmap support
+                pass
+        return chunks_contain_tabs(iter(lambda: file_checked.read(CHUNK_SIZE), b""))
+
+
+def chunks_contain_tabs(chunks):
+    return any(b"\t" in chunk for chunk in chunks)
 
 
 def main(argv=None):
@@ -0,0 +1,141 @@
+# subprocess only runs git, found in the PATH, with lists of arguments and no shell:
+import os, subprocess, threading  # nosec B404
+
+# Name of the revision under which git designates the content staged in its index:
+INDEX_REV = ""
+# Mode of the entries of git trees that are submodules:
+GIT_SUBMODULE_MODE = "160000"
+
+
+def list_paths(rev=INDEX_REV):
+    """
+    Lists the paths of the files in a git revision, or in the index, relative to the current directory.
+    """
+    if rev == INDEX_REV:
+        cmd = ["git", "ls-files", "-z"]
+    else:
+        cmd = ["git", "ls-tree", "-r", "-z", "--name-only", rev]
+    output = _git_output(cmd)
+    return [
+        path.decode("utf8", "surrogateescape") for path in output.split(b"\0") if path
+    ]
+
+
+def changed_paths(rev):
+    """
+    Lists the paths of the files whose content in the working tree differs from the one in a git revision,
+    relative to the current directory, and normalized.
+    """
+    cmd = ["git", "diff", "--name-only", "--no-renames", "-z", "--relative", rev, "--"]
+    output = _git_output(cmd)
+    return [
+        os.path.normpath(path.decode("utf8", "surrogateescape"))
+        for path in output.split(b"\0")
+        if path
+    ]
+
+
+def changed_blobs(rev_range, paths=()):
+    """
+    Lists the blobs added or modified by the commits of a git revision range, like A..B,
+    with a single `git log` call, and without reading the working tree.
+    A content found in several commits is only listed once, under the path it has in the most recent one.
+    :param rev_range: git revision range
+    :param paths: if provided, only the files matching those paths are listed
+    :return: list of (path, object name) tuples, with paths relative to the current directory
+    """
+    cmd = ["git", "log", "--format=", "--raw", "-z", "--no-renames", "--no-abbrev"]
+    cmd += ["--relative", rev_range, "--", *paths]
+    fields = iter(_git_output(cmd).split(b"\0"))
+    blobs, object_names = [], set()
+    for field in fields:
+        # Format: :<old mode> <new mode> <old object> <new object> <status>, followed by the path
+        if not field.startswith(b":"):
+            continue
+        path = next(fields).decode("utf8", "surrogateescape")
+        _, new_mode, _, object_name, status = field.decode("ascii").split(" ")
+        if (
+            status == "D"
+            or new_mode == GIT_SUBMODULE_MODE
+            or object_name in object_names
+        ):
+            continue
+        object_names.add(object_name)
+        blobs.append((path, object_name))
+    return blobs
+
+
+def read_blobs(paths, rev=INDEX_REV):
+    """
+    Yields the content of files in a git revision, or in the index, without reading the working tree.
+    :param paths: paths of the files, relative to the current directory
+    :param rev: git revision, or INDEX_REV
+    :return: iterator of (path, content) tuples, in the order of paths.
+             content is None for files that are not in this revision, and for git submodules.
+    """
+    yield from read_objects(
+        [
+            (path, f"{rev}:./{os.path.relpath(path).replace(os.sep, '/')}")
+            for path in paths
+        ]
+    )
+
+
+def read_objects(objects):
+    """
+    Yields the content of git objects.
+    All contents are streamed by a single `git cat-file --batch` process,
+    fed with the object names by a thread, so that neither pipe can fill up and block both processes.
+    :param objects: list of (path, object name) tuples, where object names are understood by git cat-file
+    :return: iterator of (path, content) tuples, in the order of objects.
+             content is None for missing objects, and for the ones that are not blobs.
+    """
+    object_names = [object_name for _, object_name in objects]
+    if any("\n" in object_name for object_name in object_names):
+        raise ValueError(
+            "git cat-file --batch does not support paths containing end-lines"
+        )
+    cmd = ["git", "cat-file", "--batch"]
+    with subprocess.Popen(  # nosec B603
+        cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE
+    ) as process:
+        assert process.stdin and process.stdout  # as both are pipes
+        writer = threading.Thread(
+            target=_write_object_names, args=(process.stdin, object_names), daemon=True
+        )
+        writer.start()
+        try:
+            for path, _ in objects:
+                yield path, _read_object(process.stdout, cmd)
+        finally:
+            process.stdout.close()  # stops git, if the iteration was interrupted
+            writer.join()
+
+
+def _git_output(cmd) -> bytes:
+    return subprocess.run(cmd, check=True, stdout=subprocess.PIPE).stdout  # nosec B603
+
+
+def _write_object_names(stdin, object_names):
+    try:
+        for object_name in object_names:
+            stdin.write(object_name.encode("utf8", "surrogateescape") + b"\n")
+        stdin.close()
+    except BrokenPipeError:  # git exited early
+        pass
+
+
+def _read_object(stdout, cmd):
+    """
+    Reads the output of git cat-file --batch for a single object:
+    either "<object name> missing", or "<sha> <type> <size>" followed by the content of the object.
+    """
+    header = stdout.readline()
+    if not header:
+        raise subprocess.CalledProcessError(1, cmd, "git exited unexpectedly")
+    if header.endswith((b" missing\n", b" ambiguous\n")):
+        return None
+    _, object_type, size = header.split()
+    content = stdout.read(int(size))
+    stdout.read(1)  # end-line following the content
+    return content if object_type == b"blob" else None
@@ -1,12 +1,23 @@
 from __future__ import annotations
+
+# pylint: disable=too-many-lines
 import argparse
+import codecs
 import collections
+import contextlib
+import io
+import itertools
+import os
 import re
 import sys
-from datetime import datetime
-from typing import Any, Sequence, Final
+from typing import Any, Sequence, Final, TYPE_CHECKING
 
-from rapidfuzz import fuzz
+# pylint: disable=import-outside-toplevel
+# Modules only needed by optional features (fuzzy matching with rapidfuzz, cache, years updates, rewrites...)
+# are imported when used: this hook is spawned for every batch of files, and should start fast.
+if TYPE_CHECKING:
+    from pre_commit_hooks.insert_license_cache import VerdictCache
+    from pre_commit_hooks.insert_license_stats import Stats
 
 DEFAULT_LICENSE_FILEPATH: Final[str] = "LICENSE.txt"
 
@@ -23,6 +34,49 @@ SKIP_LICENSE_INSERTION_COMMENT = "SKIP LICENSE INSERTION"
 
 DEBUG_LEVENSHTEIN_DISTANCE_CALCULATION = False
 
+# Encodings tried in turn to decode source files, unless configured with --encodings:
+SRC_FILE_ENCODINGS = ("utf8", "ISO-8859-1")
+UTF8_BOM = "\ufeff"
+# Byte order marks of encodings that are not supported, as line ends and comments are not encoded as in ASCII:
+UNSUPPORTED_BOMS = {
+    b"\xff\xfe\x00\x00": "UTF-32",
+    b"\x00\x00\xfe\xff": "UTF-32",
+    b"\xff\xfe": "UTF-16",
+    b"\xfe\xff": "UTF-16",
+}
+# Size of the first chunk read at the top of source files, doubled until enough lines are read:
+HEADER_CHUNK_SIZE = 8 * 1024
+# Size of the chunks read when the whole content of a source file must be decoded:
+CHUNK_SIZE = 64 * 1024
+
+# In automatic mode, a new job is only spawned for every MIN_FILES_PER_JOB files:
+MIN_FILES_PER_JOB = 100
+
+# Possible outcomes of process_file:
+FILE_CHANGED = "changed"
+FILE_WITH_TODO = "todo"
+LICENSE_UPDATE_FAILED = "update_failed"
+LICENSE_NOT_FOUND = "not_found"
+
+# Verdicts stored in the cache, for files that were not modified:
+VERDICT_SKIPPED = "skip"
+VERDICT_TODO = "todo"
+VERDICT_LICENSE_PRESENT = "present"
+VERDICT_LICENSE_ABSENT = "absent"
+# Options of this hook that have no impact on the verdicts:
+CACHE_INSENSITIVE_ARGS = (
+    "jobs",
+    "cache_dir",
+    "cache_max_entries",
+    "fsync",
+    "stats",
+    "stats_json",
+    "changed_since",
+)
+DEFAULT_CACHE_MAX_ENTRIES = 100000
+
+SERVER_SOCKET_ENV_VAR = "INSERT_LICENSE_SOCKET"
+
 LicenseInfo = collections.namedtuple(
     "LicenseInfo",
     [
@@ -33,7 +87,13 @@ LicenseInfo = collections.namedtuple(
         "comment_prefix",
         "comment_end",
         "num_extra_lines",
+        "fuzzy_license",
     ],
+    defaults=(None,),
+)
+
+FuzzyLicense = collections.namedtuple(
+    "FuzzyLicense", ["string", "tokens", "num_tokens"]
 )
 
 
@@ -44,8 +104,56 @@ class LicenseUpdateError(Exception):
 
 
 def main(argv=None) -> int:
+    if argv is None:
+        argv = sys.argv[1:]
+    # When an insert-license-server process is running, it processes the files,
+    # with the licenses it already loaded & the modules it already imported:
+    socket_path = server_socket_path()
+    if os.path.exists(socket_path):
+        from pre_commit_hooks.insert_license_client import run_in_server
+
+        return_code = run_in_server(socket_path, argv)
+        if return_code is not None:
+            return return_code
+    return run(argv)
+
+
+def run(argv, license_info_list_getter=None) -> int:
+    """
+    Runs this hook in the current process
+    :param argv: command line arguments
+    :param license_info_list_getter: function returning the LicenseInfo list, from the parsed arguments
+    """
+    args = parse_args(argv)
+    license_info_list, verdict_cache, stats = init_license_check(
+        args, license_info_list_getter
+    )
+
+    changed_files: list[str] = []
+    todo_files: list[str] = []
+
+    check_failed = process_files(
+        args, changed_files, todo_files, license_info_list, verdict_cache, stats
+    )
+    if verdict_cache:
+        verdict_cache.save()
+    if stats:
+        stats.report(summary=args.stats, json_filepath=args.stats_json)
+    return report_license_check(check_failed, changed_files, todo_files)
+
+
+def parse_args(argv) -> argparse.Namespace:
     parser = argparse.ArgumentParser()
     parser.add_argument("filenames", nargs="*", help="filenames to check")
+    add_license_arguments(parser)
+    return parser.parse_args(argv)
+
+
+def add_license_arguments(parser: argparse.ArgumentParser):
+    """
+    Adds the options of this hook to an argument parser,
+    so that they can also be provided to other entry points running it.
+    """
     parser.add_argument(
         "--license-filepath",
         action="extend",
@@ -90,6 +198,12 @@ def main(argv=None) -> int:
         help="Insert license after line matching regex (ex: '^<\\?php$')",
     )
     parser.add_argument("--remove-header", action="store_true")
+    parser.add_argument(
+        "--check-only",
+        action="store_true",
+        help="Report the files without a license header, instead of inserting it."
+        " Files are never modified, so --remove-header & --use-current-year are ignored",
+    )
     parser.add_argument(
         "--use-current-year",
         action="store_true",
@@ -104,19 +218,157 @@ def main(argv=None) -> int:
             "Allow past years in headers. License comments are not updated if they contain past years."
         ),
     )
-    args = parser.parse_args(argv)
+    parser.add_argument(
+        "--changed-since",
+        metavar="GIT_REF",
+        help="With --use-current-year, only update the years in the licenses of the files changed since this git ref,"
+        " according to `git diff GIT_REF`. Other files are only checked for the presence of a license",
+    )
+    parser.add_argument(
+        "--encodings",
+        type=_encodings_list,
+        default=",".join(SRC_FILE_ENCODINGS),
+        help="Comma-separated list of the encodings tried in turn to decode source files"
+        f" (default {','.join(SRC_FILE_ENCODINGS)}). They must be compatible with ASCII."
+        " Files starting with a UTF-8 byte order mark are always decoded as UTF-8",
+    )
+    parser.add_argument(
+        "--fsync",
+        action="store_true",
+        help="Flush modified files to the disk before exiting, for durability-sensitive environments",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=0,
+        help="Number of processes used to process files in parallel."
+        " When omitted or 0, it is picked according to the number of CPUs and of files to process",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        nargs="?",
+        const="",
+        help="Cache the verdicts on unmodified files in this directory, to skip their analysis on the next runs."
+        " When no directory is provided, it defaults to $XDG_CACHE_HOME/pre-commit-hooks",
+    )
+    parser.add_argument(
+        "--cache-max-entries",
+        type=int,
+        default=DEFAULT_CACHE_MAX_ENTRIES,
+        help=f"Maximum number of verdicts kept in the cache (default {DEFAULT_CACHE_MAX_ENTRIES})",
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        default=_env_flag("INSERT_LICENSE_STATS"),
+        help="Print on stderr the time spent in each phase of the processing, some counters and the slowest files."
+        " Can also be enabled by setting the INSERT_LICENSE_STATS environment variable to 1",
+    )
+    parser.add_argument(
+        "--stats-json",
+        default=os.environ.get("INSERT_LICENSE_STATS_JSON"),
+        help="Store those stats in this JSON file."
+        " Can also be set through the INSERT_LICENSE_STATS_JSON environment variable",
+    )
+
+
+def cache_sensitive_args(args) -> dict:
+    """
+    Returns the values of the options of this hook that the verdicts depend on,
+    leaving out the arguments of the entry points running it, like the checks selected by multi-check.
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    add_license_arguments(parser)
+    return {
+        name: getattr(args, name)
+        for name in sorted(vars(parser.parse_args([])))
+        if name not in CACHE_INSENSITIVE_ARGS
+    }
+
+
+def _env_flag(name: str) -> bool:
+    """
+    Returns whether a boolean environment variable is set, to a value other than 0, false, no or off.
+    """
+    return os.environ.get(name, "").strip().lower() not in (
+        "",
+        "0",
+        "false",
+        "no",
+        "off",
+    )
+
+
+def _encodings_list(value: str) -> tuple[str, ...]:
+    encodings = tuple(
+        encoding.strip() for encoding in value.split(",") if encoding.strip()
+    )
+    if not encodings:
+        raise argparse.ArgumentTypeError("at least one encoding is required")
+    for encoding in encodings:
+        try:
+            codecs.lookup(encoding)
+        except LookupError as error:
+            raise argparse.ArgumentTypeError(str(error)) from error
+        # Line ends & comments are looked for in raw bytes:
+        if "\r\n#".encode(encoding) != b"\r\n#":
+            raise argparse.ArgumentTypeError(
+                f"encoding not compatible with ASCII: {encoding}"
+            )
+    return encodings
+
+
+def init_license_check(
+    args, license_info_list_getter=None
+) -> tuple[list[LicenseInfo], VerdictCache | None, Stats | None]:
+    """
+    Completes the parsed arguments of this hook with their default values,
+    and loads what is needed to process files: the licenses, the optional cache and stats.
+    :param license_info_list_getter: replaces get_license_info_list, e.g. to reuse already loaded licenses
+    """
+    complete_license_args(args)
+    license_info_list = (license_info_list_getter or get_license_info_list)(args)
+
+    args.changed_filepaths = None
+    if args.use_current_year and args.changed_since:
+        from pre_commit_hooks.git_blobs import changed_paths
+
+        args.changed_filepaths = frozenset(changed_paths(args.changed_since))
+
+    verdict_cache = None
+    if args.cache_dir is not None:
+        from pre_commit_hooks.insert_license_cache import (
+            VerdictCache,
+            default_cache_dir,
+        )
+
+        verdict_cache = VerdictCache(
+            args.cache_dir or default_cache_dir(),
+            _cache_fingerprint(args, license_info_list),
+            args.cache_max_entries,
+        )
+    stats = None
+    if args.stats or args.stats_json:
+        from pre_commit_hooks.insert_license_stats import Stats
+
+        stats = Stats()
+    return license_info_list, verdict_cache, stats
+
+
+def complete_license_args(args):
+    """
+    Completes the parsed arguments of this hook with their default values,
+    that depend on other arguments.
+    """
     if args.use_current_year:
         args.allow_past_years = True
     if not args.license_filepath:
         args.license_filepath = [DEFAULT_LICENSE_FILEPATH]
 
-    license_info_list = get_license_info_list(args)
-
-    changed_files: list[str] = []
-    todo_files: list[str] = []
-
-    check_failed = process_files(args, changed_files, todo_files, license_info_list)
 
+def report_license_check(
+    check_failed, changed_files: list[str], todo_files: list[str]
+) -> int:
     if check_failed:
         print("")
         if changed_files:
@@ -134,8 +386,40 @@ def main(argv=None) -> int:
     return 0
 
 
+def _cache_fingerprint(args, license_info_list: list[LicenseInfo]) -> str:
+    """
+    Combines everything the verdicts of this hook depend on, beside the content of the files.
+    The current year is included, as licenses are updated differently once it changes.
+    """
+    from pre_commit_hooks.insert_license_cache import fingerprint
+
+    return fingerprint(
+        _current_year(),
+        cache_sensitive_args(args),
+        [license_info.prefixed_license for license_info in license_info_list],
+        [license_info.plain_license for license_info in license_info_list],
+    )
+
+
+def server_socket_path() -> str:
+    """
+    Returns the path of the Unix socket that an insert-license-server process listens on.
+    """
+    return os.environ.get(SERVER_SOCKET_ENV_VAR) or os.path.join(
+        os.environ.get("XDG_RUNTIME_DIR") or os.path.expanduser("~/.cache"),
+        "pre-commit-hooks",
+        "insert_license.sock",
+    )
+
+
+def _current_year() -> int:
+    from datetime import datetime
+
+    return datetime.now().year
+
+
 def _replace_year_in_license_with_current(plain_license: list[str], filepath: str):
-    current_year = datetime.now().year
+    current_year = _current_year()
     for i, line in enumerate(plain_license):
         updated = try_update_year(line, filepath, current_year, introduce_range=False)
         if updated:
@@ -188,17 +472,20 @@ def get_license_info_list(args) -> list[LicenseInfo]:
             comment_prefix=comment_prefix,
             comment_end=comment_end,
             num_extra_lines=num_extra_lines,
+            fuzzy_license=get_fuzzy_license(plain_license),
         )
 
         license_info_list.append(license_info)
     return license_info_list
 
 
-def process_files(  # pylint: disable=too-many-branches
+def process_files(
     args,
     changed_files: list[str],
     todo_files: list[str],
     license_info_list: list[LicenseInfo],
+    verdict_cache: VerdictCache | None = None,
+    stats: Stats | None = None,
 ) -> list[str] | bool:
     """
     Processes all license files
@@ -206,106 +493,515 @@ def process_files(  # pylint: disable=too-many-branches
     :param changed_files: list of changed files
     :param todo_files: list of files where t.o.d.o. is detected
     :param license_info_list: list of license info named tuples
+    :param verdict_cache: optional cache of the verdicts on unmodified files
+    :param stats: optional stats collected while processing the files
     :return: True if some files were changed, t.o.d.o is detected or an error occurred while updating the year
     """
     license_update_failed = False
-    after_regex = args.insert_license_after_regex
-    for src_filepath in args.filenames:
-        src_file_content, encoding = _read_file_content(src_filepath)
-        if skip_license_insert_found(
-            src_file_content=src_file_content,
-            skip_license_insertion_comment=args.skip_license_insertion_comment,
-            top_lines_count=args.detect_license_in_X_top_lines,
-        ):
-            continue
-        if fail_license_todo_found(
-            src_file_content=src_file_content,
-            fuzzy_match_todo_comment=args.fuzzy_match_todo_comment,
-            top_lines_count=args.detect_license_in_X_top_lines,
+    license_index = LicenseIndex(license_info_list)
+    for src_filepath, status in zip(
+        args.filenames,
+        _process_all_files(args, license_index, verdict_cache, stats),
+    ):
+        if record_status(src_filepath, status, changed_files, todo_files):
+            license_update_failed = True
+    return changed_files or todo_files or license_update_failed
+
+
+def record_status(
+    src_filepath: str,
+    status: str | None,
+    changed_files: list[str],
+    todo_files: list[str],
+) -> bool:
+    """
+    Adds a file to the list matching the status returned by process_file
+    :return: True if an error occurred while updating the year, or if the license is missing with --check-only
+    """
+    if status == FILE_CHANGED:
+        changed_files.append(src_filepath)
+    elif status == FILE_WITH_TODO:
+        todo_files.append(src_filepath)
+    return status in (LICENSE_UPDATE_FAILED, LICENSE_NOT_FOUND)
+
+
+def _process_all_files(
+    args,
+    license_index: LicenseIndex,
+    verdict_cache: VerdictCache | None,
+    stats: Stats | None,
+):
+    """
+    Yields the status returned by process_file for every file in args.filenames, in order.
+    When several jobs are used, files are processed by a pool of processes,
+    and what each of them prints is output in the order of args.filenames.
+    """
+    jobs = _jobs_count(args.jobs, len(args.filenames))
+    if jobs == 1:
+        for src_filepath in args.filenames:
+            yield process_file(
+                args, src_filepath, license_index, verdict_cache, stats=stats
+            )
+        return
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        initializer=_init_worker,
+        initargs=(args, license_index, verdict_cache, stats is not None),
+    ) as executor:
+        for status, output, error, cache_updates, stats_updates in executor.map(
+            _process_file_in_worker,
+            args.filenames,
+            chunksize=max(1, len(args.filenames) // (jobs * 4)),
         ):
-            todo_files.append(src_filepath)
-            continue
+            print(output, end="")
+            if verdict_cache:
+                verdict_cache.merge_updates(cache_updates)
+            if stats:
+                stats.merge_updates(stats_updates)
+            if error is not None:
+                raise error
+            yield status
 
-        license_header_index = None
-        license_info = None
-        for license_info in license_info_list:
-            license_header_index = find_license_header_index(
-                src_file_content=src_file_content,
-                license_info=license_info,
-                top_lines_count=args.detect_license_in_X_top_lines,
-                match_years_strictly=not args.allow_past_years,
+
+def _jobs_count(jobs: int, files_count: int) -> int:
+    if jobs <= 0:  # automatic mode
+        jobs = min(os.cpu_count() or 1, files_count // MIN_FILES_PER_JOB)
+    return max(1, min(jobs, files_count))
+
+
+# State shared by all the files processed by a worker process:
+_WORKER_STATE: dict[str, Any] = {}
+
+
+def _init_worker(args, license_index, verdict_cache, with_stats):
+    stats = None
+    if with_stats:
+        from pre_commit_hooks.insert_license_stats import Stats
+
+        stats = Stats()
+    _WORKER_STATE.update(
+        args=args, license_index=license_index, verdict_cache=verdict_cache, stats=stats
+    )
+
+
+def _process_file_in_worker(src_filepath):
+    """
+    Runs process_file in a worker process, capturing what it prints
+    so that it can be output by the main process,
+    along with the cache updates that the main process will save,
+    and the stats that it will report.
+    """
+    output = io.StringIO()
+    status, error = None, None
+    verdict_cache, stats = _WORKER_STATE["verdict_cache"], _WORKER_STATE["stats"]
+    with contextlib.redirect_stdout(output):
+        try:
+            status = process_file(
+                _WORKER_STATE["args"],
+                src_filepath,
+                _WORKER_STATE["license_index"],
+                verdict_cache,
+                stats=stats,
             )
-            if license_header_index is not None:
-                break
-        fuzzy_match_header_index = None
-        if args.fuzzy_match_generates_todo and license_header_index is None:
-            for license_info in license_info_list:
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            error = exc
+    cache_updates = verdict_cache.pop_updates() if verdict_cache else {}
+    stats_updates = stats.pop_updates() if stats else {}
+    return status, output.getvalue(), error, cache_updates, stats_updates
+
+
+def process_file(  # pylint: disable=too-many-arguments
+    args,
+    src_filepath: str,
+    license_index: LicenseIndex,
+    verdict_cache: VerdictCache | None = None,
+    src_file_bytes: bytes | None = None,
+    stats: Stats | None = None,
+) -> str | None:
+    """
+    Processes a single source file
+    :param args: arguments of the hook
+    :param src_filepath: path of the src_file
+    :param license_index: index of all the licenses
+    :param verdict_cache: optional cache of the verdicts on unmodified files
+    :param src_file_bytes: content of the src_file, if it has already been read
+    :param stats: optional stats, completed with the processing of this file
+    :return: FILE_CHANGED, FILE_WITH_TODO, LICENSE_UPDATE_FAILED, LICENSE_NOT_FOUND or None if there is nothing to report
+    """
+    if not stats:
+        return _process_file(
+            args, src_filepath, license_index, verdict_cache, src_file_bytes
+        )
+    with stats.file(src_filepath):
+        status = _process_file(
+            args, src_filepath, license_index, verdict_cache, src_file_bytes, stats
+        )
+    if status:
+        stats.count(status)
+    return status
+
+
+def _phase(stats: Stats | None, name: str):
+    return stats.phase(name) if stats else contextlib.nullcontext()
+
+
+def _process_file(  # pylint: disable=too-many-arguments,too-many-branches,too-many-return-statements
+    args,
+    src_filepath: str,
+    license_index: LicenseIndex,
+    verdict_cache: VerdictCache | None,
+    src_file_bytes: bytes | None,
+    stats: Stats | None = None,
+) -> str | None:
+    license_info_list = license_index.license_info_list
+    # Only the top of the file is needed to detect the license,
+    # and rewrites only replace some of those lines, copying the rest of the file as is.
+    # Those top lines are matched as bytes, and only decoded when the file may be rewritten:
+    with _phase(stats, "read"):
+        header_lines = _read_header_lines(
+            src_filepath,
+            max_lines=_header_lines_count(args, license_info_list),
+            src_file_bytes=src_file_bytes,
+        )
+    update_year_range = args.use_current_year and (
+        args.changed_filepaths is None
+        or os.path.normpath(src_filepath) in args.changed_filepaths
+    )
+    # As the verdict only depends on those top lines, they are enough to key the cache,
+    # along with whether years are updated, as it can change from one run to the other with --changed-since:
+    cache_key = verdict_cache.content_digest(header_lines) if verdict_cache else ""
+    if cache_key and update_year_range != args.use_current_year:
+        cache_key += "-without-year-update"
+    if verdict_cache:
+        verdict = verdict_cache.get(cache_key)
+        if verdict is not None:
+            if stats:
+                stats.count("cache_hits")
+            if verdict == VERDICT_LICENSE_ABSENT and args.check_only:
+                return _report_license_not_found(src_filepath)
+            return FILE_WITH_TODO if verdict == VERDICT_TODO else None
+    # A UTF-8 byte order mark tells the encoding of the file,
+    # and must not prevent from finding what starts the first line:
+    raw_lines = _without_bom(header_lines)
+    encodings = ("utf8",) if raw_lines[:1] != header_lines[:1] else args.encodings
+    with _phase(stats, "comments_search"):
+        skip_found = _encoded_comment_found(
+            skip_license_insert_found,
+            raw_lines,
+            args.skip_license_insertion_comment,
+            args.detect_license_in_X_top_lines,
+            encodings,
+        )
+        todo_found = not skip_found and _encoded_comment_found(
+            fail_license_todo_found,
+            raw_lines,
+            args.fuzzy_match_todo_comment,
+            args.detect_license_in_X_top_lines,
+            encodings,
+        )
+    if skip_found:
+        _cache_verdict(verdict_cache, cache_key, VERDICT_SKIPPED)
+        return None
+    if todo_found:
+        _cache_verdict(verdict_cache, cache_key, VERDICT_TODO)
+        return FILE_WITH_TODO
+
+    with _phase(stats, "exact_match"):
+        license_info, license_header_index = license_index.find_in_raw_lines(
+            raw_lines,
+            top_lines_count=args.detect_license_in_X_top_lines,
+            match_years_strictly=not args.allow_past_years,
+            encodings=encodings,
+        )
+    if license_info is not None and license_header_index is not None:
+        if (args.remove_header or update_year_range) and not args.check_only:
+            with _phase(stats, "decode"):
+                src_file_content, encoding = _decode_lines(
+                    src_filepath, header_lines, encodings
+                )
+            try:
+                with _phase(stats, "rewrite"):
+                    license_changed = license_found(
+                        remove_header=args.remove_header,
+                        update_year_range=update_year_range,
+                        license_header_index=license_header_index,
+                        license_info=license_info,
+                        src_file_content=src_file_content,
+                        src_filepath=src_filepath,
+                        encoding=encoding,
+                        fsync=args.fsync,
+                    )
+            except LicenseUpdateError as error:
+                print(error)
+                return LICENSE_UPDATE_FAILED
+            if license_changed:
+                return FILE_CHANGED
+        _cache_verdict(verdict_cache, cache_key, VERDICT_LICENSE_PRESENT)
+        return None
+    if args.check_only:
+        _cache_verdict(verdict_cache, cache_key, VERDICT_LICENSE_ABSENT)
+        return _report_license_not_found(src_filepath)
+
+    with _phase(stats, "decode"):
+        src_file_content, encoding = _decode_lines(
+            src_filepath,
+            header_lines,
+            encodings,
+            inserted_texts=_inserted_texts(args, license_info_list),
+        )
+    if args.fuzzy_match_generates_todo:
+        for license_info in license_info_list:
+            with _phase(stats, "fuzzy_match"):
                 fuzzy_match_header_index = fuzzy_find_license_header_index(
-                    src_file_content=src_file_content,
+                    src_file_content=_without_bom(src_file_content),
                     license_info=license_info,
                     top_lines_count=args.detect_license_in_X_top_lines,
                     fuzzy_match_extra_lines_to_check=args.fuzzy_match_extra_lines_to_check,
                     fuzzy_ratio_cut_off=args.fuzzy_ratio_cut_off,
                 )
-                if fuzzy_match_header_index is not None:
-                    break
-        if license_header_index is not None:
-            try:
-                if license_found(
-                    remove_header=args.remove_header,
-                    update_year_range=args.use_current_year,
-                    license_header_index=license_header_index,
-                    license_info=license_info,
-                    src_file_content=src_file_content,
-                    src_filepath=src_filepath,
-                    encoding=encoding,
-                ):
-                    changed_files.append(src_filepath)
-            except LicenseUpdateError as error:
-                print(error)
-                license_update_failed = True
-        else:
             if fuzzy_match_header_index is not None:
-                if fuzzy_license_found(
-                    license_info=license_info,
-                    fuzzy_match_header_index=fuzzy_match_header_index,
-                    fuzzy_match_todo_comment=args.fuzzy_match_todo_comment,
-                    fuzzy_match_todo_instructions=args.fuzzy_match_todo_instructions,
-                    src_file_content=src_file_content,
-                    src_filepath=src_filepath,
-                    encoding=encoding,
-                ):
-                    todo_files.append(src_filepath)
-            else:
-                if license_not_found(
-                    remove_header=args.remove_header,
-                    license_info=license_info_list[0],
-                    src_file_content=src_file_content,
-                    src_filepath=src_filepath,
-                    encoding=encoding,
-                    after_regex=after_regex,
-                ):
-                    changed_files.append(src_filepath)
-    return changed_files or todo_files or license_update_failed
+                with _phase(stats, "rewrite"):
+                    todo_inserted = fuzzy_license_found(
+                        license_info=license_info,
+                        fuzzy_match_header_index=fuzzy_match_header_index,
+                        fuzzy_match_todo_comment=args.fuzzy_match_todo_comment,
+                        fuzzy_match_todo_instructions=args.fuzzy_match_todo_instructions,
+                        src_file_content=src_file_content,
+                        src_filepath=src_filepath,
+                        encoding=encoding,
+                        fsync=args.fsync,
+                    )
+                return FILE_WITH_TODO if todo_inserted else None
+    with _phase(stats, "rewrite"):
+        license_inserted = license_not_found(
+            remove_header=args.remove_header,
+            license_info=license_info_list[0],
+            src_file_content=src_file_content,
+            src_filepath=src_filepath,
+            encoding=encoding,
+            after_regex=args.insert_license_after_regex,
+            fsync=args.fsync,
+        )
+    if license_inserted:
+        return FILE_CHANGED
+    _cache_verdict(verdict_cache, cache_key, VERDICT_LICENSE_ABSENT)
+    return None
+
+
+def _inserted_texts(args, license_info_list: list[LicenseInfo]) -> list[str]:
+    """
+    Returns the texts that can be inserted in a source file without license: the license, or a TODO comment.
+    """
+    inserted_texts = list(license_info_list[0].prefixed_license)
+    if args.fuzzy_match_generates_todo:
+        inserted_texts += [
+            args.fuzzy_match_todo_comment,
+            args.fuzzy_match_todo_instructions,
+        ]
+    return inserted_texts
+
+
+def _report_license_not_found(src_filepath: str) -> str:
+    print(f"License header not found in: {src_filepath}")
+    return LICENSE_NOT_FOUND
+
+
+def _cache_verdict(verdict_cache: VerdictCache | None, cache_key: str, verdict: str):
+    if verdict_cache:
+        verdict_cache.set(cache_key, verdict)
+
+
+def _header_lines_count(args, license_info_list: list[LicenseInfo]) -> int:
+    """
+    Returns the number of lines, at the top of a source file,
+    that can be inspected while detecting the license header
+    (or the skip / TODO comments).
+    """
+    return (
+        args.detect_license_in_X_top_lines
+        + max(
+            len(license_info.plain_license) + license_info.num_extra_lines
+            for license_info in license_info_list
+        )
+        + args.fuzzy_match_extra_lines_to_check
+    )
+
+
+def _read_header_lines(src_filepath, max_lines, src_file_bytes=None) -> list[bytes]:
+    """
+    Reads the top lines of a source file, without decoding them.
+    As when reading it in text mode with newline="", lines end with \\n, \\r or \\r\\n, that are kept.
+    :param src_filepath: path of the src_file
+    :param max_lines: number of lines to read
+    :param src_file_bytes: if provided, lines are read from this content instead of the file
+    """
+    with (
+        open(src_filepath, "rb")
+        if src_file_bytes is None
+        else io.BytesIO(src_file_bytes)
+    ) as src_file:
+        data, chunk_size = b"", HEADER_CHUNK_SIZE
+        while True:
+            chunk = src_file.read(chunk_size)
+            data += chunk
+            lines = data.splitlines(keepends=True)
+            # An extra line ensures that the last one kept is complete, including a \r\n split between chunks:
+            if not chunk or len(lines) > max_lines:
+                return lines[:max_lines]
+            chunk_size *= 2
+
+
+def _decode_lines(
+    src_filepath,
+    raw_lines: list[bytes],
+    encodings=SRC_FILE_ENCODINGS,
+    inserted_texts: Sequence[str] = (),
+) -> tuple[list[str], str]:
+    """
+    Decodes lines read by _read_header_lines, with the encoding sniffed by _sniff_encoding.
+    ASCII-only lines are decoded the same way by all encodings, and do not tell which one the file uses:
+    if some non-ASCII text may then be inserted, the encoding is sniffed on the rest of the file,
+    so that this text is not encoded differently from the other lines.
+    :param inserted_texts: texts that may be inserted in the file
+    :return: Tuple of the decoded lines and the encoding used to decode them
+    """
+    try:
+        if all(line.isascii() for line in raw_lines) and not all(
+            text.isascii() for text in inserted_texts
+        ):
+            encoding = _sniff_remaining_lines_encoding(
+                src_filepath, raw_lines, encodings
+            )
+        else:
+            encoding = _sniff_encoding(raw_lines, encodings)
+        return [line.decode(encoding) for line in raw_lines], encoding
+    except UnicodeError:
+        print(
+            f"Error while processing: {src_filepath} - file encoding is probably not supported"
+        )
+        raise
 
 
-def _read_file_content(src_filepath):
+def _sniff_encoding(raw_lines: list[bytes], encodings) -> str:
+    """
+    Detects the encoding of the top lines of a source file, without relying on a slow detector:
+    byte order marks are checked first, then ASCII-only lines are decoded with the first encoding,
+    and otherwise encodings are tried in turn.
+    :raise UnicodeError: if none of the encodings is suitable
+    """
+    first_line = raw_lines[0] if raw_lines else b""
+    if first_line.startswith(codecs.BOM_UTF8):
+        return "utf8"
+    for bom, unsupported_encoding in UNSUPPORTED_BOMS.items():
+        if first_line.startswith(bom):
+            raise UnicodeError(f"{unsupported_encoding} is not supported")
+    if all(line.isascii() for line in raw_lines):
+        return encodings[0]
     last_error = None
-    for encoding in (
-        "utf8",
-        "ISO-8859-1",
-    ):  # we could use the chardet library to support more encodings
+    for encoding in encodings:
         try:
-            with open(src_filepath, encoding=encoding, newline="") as src_file:
-                return src_file.readlines(), encoding
+            for line in raw_lines:
+                line.decode(encoding)
+            return encoding
         except UnicodeDecodeError as error:
             last_error = error
-    print(
-        f"Error while processing: {src_filepath} - file encoding is probably not supported"
-    )
     if last_error is not None:  # Avoid mypy message
         raise last_error
-    raise RuntimeError("Unexpected branch taken (_read_file_content)")
+    raise RuntimeError("Unexpected branch taken (_sniff_encoding)")
+
+
+def _sniff_remaining_lines_encoding(
+    src_filepath, ascii_lines: list[bytes], encodings
+) -> str:
+    """
+    Detects the encoding of a source file whose top lines are ASCII-only,
+    by streaming the rest of it through an incremental decoder per encoding.
+    :return: the first of the encodings that decodes the whole file
+    :raise UnicodeError: if none of the encodings is suitable
+    """
+    decoders = {
+        encoding: codecs.getincrementaldecoder(encoding)() for encoding in encodings
+    }
+    last_error = None
+    with open(src_filepath, "rb") as src_file:
+        src_file.seek(sum(len(line) for line in ascii_lines))
+        while decoders:
+            chunk = src_file.read(CHUNK_SIZE)
+            for encoding, decoder in list(decoders.items()):
+                try:
+                    decoder.decode(chunk, final=not chunk)
+                except UnicodeDecodeError as error:
+                    last_error = error
+                    del decoders[encoding]
+            if not chunk:
+                break
+    if decoders:
+        return next(iter(decoders))
+    if last_error is not None:  # Avoid mypy message
+        raise last_error
+    raise RuntimeError("Unexpected branch taken (_sniff_remaining_lines_encoding)")
+
+
+def _without_bom(lines):
+    """
+    Returns the lines, raw or decoded, without the UTF-8 byte order mark starting the first one if any
+    """
+    bom = UTF8_BOM if lines and isinstance(lines[0], str) else codecs.BOM_UTF8
+    if lines and lines[0].startswith(bom):
+        return [lines[0][len(bom) :]] + lines[1:]
+    return lines
+
+
+def _line_offset(src_file_content, line_index, encoding):
+    """
+    Returns the offset in bytes where a line starts,
+    knowing that a byte order mark must stay at the very beginning of the file.
+    """
+    if line_index == 0:
+        return _encoded_size(src_file_content[:1], encoding) - _encoded_size(
+            _without_bom(src_file_content)[:1], encoding
+        )
+    return _encoded_size(src_file_content[:line_index], encoding)
+
+
+def _encoded_comment_found(
+    check_function, raw_lines, comment, top_lines_count, encodings=SRC_FILE_ENCODINGS
+):
+    """
+    Runs one of skip_license_insert_found or fail_license_todo_found on raw lines,
+    with the comment encoded with each of the encodings supported.
+    """
+    return any(
+        check_function(raw_lines, encoded_comment, top_lines_count)
+        for encoded_comment in _encoded_variants(comment, encodings)
+    )
+
+
+def _encoded_variants(text: str, encodings=SRC_FILE_ENCODINGS) -> set[bytes]:
+    encoded_variants = set()
+    for encoding in encodings:
+        with contextlib.suppress(UnicodeEncodeError):
+            encoded_variants.add(text.encode(encoding))
+    return encoded_variants
+
+
+def _encoded_size(lines, encoding):
+    return len("".join(lines).encode(encoding, "surrogateescape"))
+
+
+@contextlib.contextmanager
+def _open_remaining_lines(src_filepath, src_file_content, encoding):
+    """
+    Yields the lines of a source file that follow the ones already read in src_file_content.
+    As they may not be decodable with the same encoding, undecodable bytes are escaped.
+    """
+    with open(src_filepath, "rb") as src_file:
+        src_file.seek(_encoded_size(src_file_content, encoding))
+        yield io.TextIOWrapper(
+            src_file, encoding=encoding, errors="surrogateescape", newline=""
+        )
 
 
 def license_not_found(  # pylint: disable=too-many-arguments
@@ -315,6 +1011,7 @@ def license_not_found(  # pylint: disable=too-many-arguments
     src_filepath: str,
     encoding: str,
     after_regex: str,
+    fsync: bool = False,
 ) -> bool:
     """
     Executed when license is not found.
@@ -324,37 +1021,48 @@ def license_not_found(  # pylint: disable=too-many-arguments
     :param license_info: license info named tuple
     :param src_file_content: content of the src_file
     :param src_filepath: path of the src_file
+    :param fsync: whether to flush the modified file to the disk
     :return: True if change was made, False otherwise
     """
     if not remove_header:
-        index = 0
-        for index, line in enumerate(src_file_content):
-            stripped_line = line.strip()
-            # Special treatment for user provided regex,
-            # or shebang, file encoding directive,
-            # and empty lines when at the beginning of the file.
-            # (adds license only after those)
-            if after_regex is not None and after_regex != "":
-                if re.match(after_regex, stripped_line):
-                    index += 1  # Skip matched line
-                    break  # And insert after that line.
-            elif (
-                not stripped_line.startswith("#!")
-                and not stripped_line.startswith("# -*- coding")
-                and not stripped_line == ""
+        start_offset = _line_offset(src_file_content, 0, encoding)
+        offset = start_offset
+        with _open_remaining_lines(
+            src_filepath, src_file_content, encoding
+        ) as remaining_lines:
+            # Lines are only read from the file if the insertion point was not found in the top ones:
+            for line in itertools.chain(
+                _without_bom(src_file_content), remaining_lines
             ):
-                break
-        else:
-            # We got all the way to the end without hitting `break`, reset it to line 0
-            index = 0
-        src_file_content = (
-            src_file_content[:index]
-            + license_info.prefixed_license
-            + [license_info.eol]
-            + src_file_content[index:]
+                stripped_line = line.strip()
+                # Special treatment for user provided regex,
+                # or shebang, file encoding directive,
+                # and empty lines when at the beginning of the file.
+                # (adds license only after those)
+                if after_regex is not None and after_regex != "":
+                    if re.match(after_regex, stripped_line):
+                        offset += _encoded_size([line], encoding)  # Skip matched line
+                        break  # And insert after that line.
+                elif (
+                    not stripped_line.startswith("#!")
+                    and not stripped_line.startswith("# -*- coding")
+                    and not stripped_line == ""
+                ):
+                    break
+                offset += _encoded_size([line], encoding)
+            else:
+                # We got all the way to the end without hitting `break`, reset it to line 0
+                offset = start_offset
+        from pre_commit_hooks.atomic_write import splice_file
+
+        splice_file(
+            src_filepath,
+            offset,
+            inserted="".join(license_info.prefixed_license + [license_info.eol]).encode(
+                encoding
+            ),
+            fsync=fsync,
         )
-        with open(src_filepath, "w", encoding=encoding, newline="") as src_file:
-            src_file.write("".join(src_file_content))
         return True
     return False
 
@@ -424,7 +1132,7 @@ def try_update_year_range(
     :param license_header_index: line where the license starts
     :return: source file contents and a flag indicating update
     """
-    current_year = datetime.now().year
+    current_year = _current_year()
     changed = False
     for i in range(license_header_index, license_header_index + license_length):
         updated = try_update_year(
@@ -444,6 +1152,7 @@ def license_found(
     src_file_content,
     src_filepath,
     encoding,
+    fsync=False,
 ):  # pylint: disable=too-many-arguments
     """
     Executed when license is found. It does nothing if remove_header is False,
@@ -454,42 +1163,52 @@ def license_found(
     :param license_info: license_info tuple
     :param src_file_content: content of the src_file
     :param src_filepath: path of the src_file
+    :param fsync: whether to flush the modified file to the disk
     :return: True if change was made, False otherwise
     """
+    license_length = len(license_info.prefixed_license)
+    removed_lines_count = license_length
+    inserted_lines: Sequence[str] = []
     updated = False
     if remove_header:
-        last_license_line_index = license_header_index + len(
-            license_info.prefixed_license
-        )
-        if (
+        last_license_line_index = license_header_index + license_length
+        if not (
             last_license_line_index < len(src_file_content)
             and src_file_content[last_license_line_index].strip()
         ):
-            src_file_content = (
-                src_file_content[:license_header_index]
-                + src_file_content[
-                    license_header_index + len(license_info.prefixed_license) :
-                ]
-            )
-        else:
-            src_file_content = (
-                src_file_content[:license_header_index]
-                + src_file_content[
-                    license_header_index + len(license_info.prefixed_license) + 1 :
-                ]
-            )
+            removed_lines_count += 1  # also removing the empty line after the license
         updated = True
     elif update_year_range:
-        src_file_content, updated = try_update_year_range(
-            src_file_content,
-            src_filepath,
-            license_header_index,
-            len(license_info.prefixed_license),
+        license_lines = src_file_content[
+            license_header_index : license_header_index + license_length
+        ]
+        inserted_lines, updated = try_update_year_range(
+            list(license_lines), src_filepath, 0, len(license_lines)
         )
 
     if updated:
-        with open(src_filepath, "w", encoding=encoding, newline="") as src_file:
-            src_file.write("".join(src_file_content))
+        from pre_commit_hooks.atomic_write import splice_file
+
+        if remove_header:
+            offset = _line_offset(src_file_content, license_header_index, encoding)
+            end_offset = _line_offset(
+                src_file_content, license_header_index + removed_lines_count, encoding
+            )
+        else:
+            offset = _encoded_size(src_file_content[:license_header_index], encoding)
+            end_offset = offset + _encoded_size(
+                src_file_content[
+                    license_header_index : license_header_index + removed_lines_count
+                ],
+                encoding,
+            )
+        splice_file(
+            src_filepath,
+            offset,
+            inserted="".join(inserted_lines).encode(encoding),
+            removed_size=end_offset - offset,
+            fsync=fsync,
+        )
 
     return updated
 
@@ -502,6 +1221,7 @@ def fuzzy_license_found(
     src_file_content,
     src_filepath,
     encoding,
+    fsync=False,
 ):
     """
     Executed when fuzzy license is found. It inserts comment indicating that the license should be
@@ -512,39 +1232,207 @@ def fuzzy_license_found(
     :param fuzzy_match_todo_instructions: instructions for fuzzy_match removal
     :param src_file_content: content of the src_file
     :param src_filepath: path of the src_file
+    :param fsync: whether to flush the modified file to the disk
     :return: True if change was made, False otherwise
     """
-    src_file_content = (
-        src_file_content[:fuzzy_match_header_index]
-        + [license_info.comment_prefix + fuzzy_match_todo_comment + license_info.eol]
-        + [
-            license_info.comment_prefix
-            + fuzzy_match_todo_instructions
-            + license_info.eol
-        ]
-        + src_file_content[fuzzy_match_header_index:]
+    todo_lines = [
+        license_info.comment_prefix + fuzzy_match_todo_comment + license_info.eol,
+        license_info.comment_prefix + fuzzy_match_todo_instructions + license_info.eol,
+    ]
+    from pre_commit_hooks.atomic_write import splice_file
+
+    splice_file(
+        src_filepath,
+        _line_offset(src_file_content, fuzzy_match_header_index, encoding),
+        inserted="".join(todo_lines).encode(encoding),
+        fsync=fsync,
     )
-    with open(src_filepath, "w", encoding=encoding, newline="") as src_file:
-        src_file.write("".join(src_file_content))
     return True
 
 
 # More flexible than _YEAR_RANGE_PATTERN. For detecting all years in a line, not just a range.
 _YEARS_PATTERN = re.compile(r"\b\d{4}([ ,-]+\d{2,4})*\b")
+_YEARS_BYTES_PATTERN = re.compile(_YEARS_PATTERN.pattern.encode("ascii"))
 
 
 def _strip_years(line):
-    return _YEARS_PATTERN.sub("", line)
+    if isinstance(line, str):
+        return _YEARS_PATTERN.sub("", line)
+    return _YEARS_BYTES_PATTERN.sub(b"", line)
+
 
+# The ASCII characters stripped by str.strip(), that are not all stripped by bytes.strip():
+_ASCII_WHITESPACES = bytes(char for char in range(128) if chr(char).isspace())
+
+
+def _strip(line, encoding):
+    if isinstance(line, str):
+        return line.strip()
+    if encoding and not line.isascii():
+        try:
+            return line.decode(encoding).strip().encode(encoding)
+        except UnicodeDecodeError:
+            pass
+    return line.strip(_ASCII_WHITESPACES)
 
-def _license_line_matches(license_line, src_file_line, match_years_strictly):
-    license_line = license_line.strip()
-    src_file_line = src_file_line.strip()
 
+def normalize_lines(lines, match_years_strictly, encoding=None) -> list:
+    """
+    Returns the lines in the form used to compare license lines to source file lines:
+    stripped, and without years if they do not have to match strictly.
+    Lines can be either strings or bytes, whose non-ASCII lines are decoded with `encoding`, if any,
+    to be stripped of the same whitespaces as strings.
+    """
+    stripped_lines = [_strip(line, encoding) for line in lines]
     if match_years_strictly:
-        return license_line == src_file_line
+        return stripped_lines
+    return [_strip_years(line) for line in stripped_lines]
+
+
+class LicenseMatcher:  # pylint: disable=too-few-public-methods
+    """
+    Pre-normalized lines of a prefixed license, as strings or bytes,
+    to find where this license starts in source files.
+    """
+
+    def __init__(self, prefixed_license, encoding=None):
+        self.lines = normalize_lines(
+            prefixed_license, match_years_strictly=True, encoding=encoding
+        )
+        self.lines_without_years = [_strip_years(line) for line in self.lines]
+
+    def find(self, normalized_src_lines, top_lines_count, match_years_strictly):
+        """
+        Returns the line number, starting from 0 and lower than `top_lines_count`,
+        where the license starts in the source lines normalized by normalize_lines, or else None.
+        """
+        license_lines = self.lines if match_years_strictly else self.lines_without_years
+        end = min(top_lines_count, len(normalized_src_lines) - len(license_lines) + 1)
+        i = -1
+        while True:
+            # The search for the first line is performed by list.index, in C,
+            # and the whole license is only compared on the offsets found:
+            try:
+                i = normalized_src_lines.index(license_lines[0], i + 1, max(end, 0))
+            except ValueError:
+                return None
+            if normalized_src_lines[i : i + len(license_lines)] == license_lines:
+                return i
+
+
+class LicenseIndex:  # pylint: disable=too-few-public-methods
+    """
+    Index of all the licenses, to find them in the top lines of source files, read as bytes.
+    Licenses are indexed as encoded with each of the encodings of source files,
+    on first use of those encodings.
+    """
+
+    def __init__(self, license_info_list: list[LicenseInfo]):
+        self.license_info_list = license_info_list
+        self._encoded_indexes: dict[tuple[str, ...], list[_EncodedLicenseIndex]] = {}
+
+    def find_in_raw_lines(
+        self,
+        raw_src_lines,
+        top_lines_count,
+        match_years_strictly,
+        encodings=SRC_FILE_ENCODINGS,
+    ) -> tuple[LicenseInfo | None, int | None]:
+        """
+        Returns the license found in the source lines read as bytes,
+        and the line number, lower than `top_lines_count`, where it starts, or else (None, None).
+        Licenses are looked for as encoded with each of the encodings provided, in turn.
+        """
+        if encodings not in self._encoded_indexes:
+            self._encoded_indexes[encodings] = _encoded_license_indexes(
+                self.license_info_list, encodings
+            )
+        try:
+            encoding = _sniff_encoding(raw_src_lines, encodings)
+        except UnicodeError:
+            encoding = None
+        # Source lines are normalized once, then compared to all licenses at once:
+        normalized_src_lines = normalize_lines(
+            raw_src_lines, match_years_strictly, encoding
+        )
+        for encoded_index in self._encoded_indexes[encodings]:
+            license_info, license_header_index = encoded_index.find(
+                normalized_src_lines, top_lines_count, match_years_strictly
+            )
+            if license_header_index is not None:
+                return license_info, license_header_index
+        return None, None
+
+
+class _EncodedLicenseIndex:  # pylint: disable=too-few-public-methods
+    """
+    Index of all the licenses, encoded with a given encoding, by their first normalized line,
+    so that each source file offset is checked against all of them in a single lookup.
+    """
+
+    def __init__(self, license_info_list: list[LicenseInfo], encoding: str):
+        self.license_info_list = license_info_list
+        self._by_first_line: dict[bytes, list[tuple[int, list]]] = {}
+        self._by_first_line_without_years: dict[bytes, list[tuple[int, list]]] = {}
+        for position, license_info in enumerate(license_info_list):
+            matcher = LicenseMatcher(
+                [line.encode(encoding) for line in license_info.prefixed_license],
+                encoding,
+            )
+            self._by_first_line.setdefault(matcher.lines[0], []).append(
+                (position, matcher.lines)
+            )
+            self._by_first_line_without_years.setdefault(
+                matcher.lines_without_years[0], []
+            ).append((position, matcher.lines_without_years))
+
+    def find(
+        self, normalized_src_lines, top_lines_count, match_years_strictly
+    ) -> tuple[LicenseInfo | None, int | None]:
+        """
+        As when looking for each license in turn, the first one of the list that matches wins.
+        """
+        by_first_line = (
+            self._by_first_line
+            if match_years_strictly
+            else self._by_first_line_without_years
+        )
+        best_position, best_index = len(self.license_info_list), None
+        for i, src_line in enumerate(normalized_src_lines[:top_lines_count]):
+            for position, license_lines in by_first_line.get(src_line, ()):
+                if (
+                    position < best_position
+                    and normalized_src_lines[i : i + len(license_lines)]
+                    == license_lines
+                ):
+                    best_position, best_index = position, i
+            if best_position == 0:
+                break
+        if best_index is None:
+            return None, None
+        return self.license_info_list[best_position], best_index
+
 
-    return _strip_years(license_line) == _strip_years(src_file_line)
+def _encoded_license_indexes(
+    license_info_list: list[LicenseInfo], encodings
+) -> list[_EncodedLicenseIndex]:
+    """
+    Returns an index of the licenses for each encoding in which they have a distinct representation,
+    skipping the encodings that can not represent them.
+    """
+    encoded_indexes, encoded_licenses = [], set()
+    for encoding in encodings:
+        try:
+            encoded_license = "".join(
+                "".join(license_info.prefixed_license)
+                for license_info in license_info_list
+            ).encode(encoding)
+        except UnicodeEncodeError:
+            continue
+        if encoded_license not in encoded_licenses:
+            encoded_licenses.add(encoded_license)
+            encoded_indexes.append(_EncodedLicenseIndex(license_info_list, encoding))
+    return encoded_indexes
 
 
 def find_license_header_index(
@@ -554,17 +1442,12 @@ def find_license_header_index(
     Returns the line number, starting from 0 and lower than `top_lines_count`,
     where the license header comment starts in this file, or else None.
     """
-    for i in range(top_lines_count):
-        license_match = True
-        for j, license_line in enumerate(license_info.prefixed_license):
-            if i + j >= len(src_file_content) or not _license_line_matches(
-                license_line, src_file_content[i + j], match_years_strictly
-            ):
-                license_match = False
-                break
-        if license_match:
-            return i
-    return None
+    matcher = LicenseMatcher(license_info.prefixed_license)
+    normalized_src_lines = normalize_lines(
+        src_file_content[: top_lines_count + len(matcher.lines)],
+        match_years_strictly,
+    )
+    return matcher.find(normalized_src_lines, top_lines_count, match_years_strictly)
 
 
 def skip_license_insert_found(
@@ -609,23 +1492,47 @@ def fuzzy_find_license_header_index(
     where the fuzzy matching found best match with ratio higher than the cutoff ratio.
     """
     best_line_number_match = None
-    best_ratio = 0
+    best_ratio: float = 0
     best_num_token_diff = 0
-    license_string = (
-        " ".join(license_info.plain_license).replace("\n", "").replace("\r", "").strip()
+    fuzzy_license = license_info.fuzzy_license or get_fuzzy_license(
+        license_info.plain_license
+    )
+    license_string = fuzzy_license.string
+    expected_num_tokens = fuzzy_license.num_tokens
+    candidate_length = (
+        len(license_info.plain_license)
+        + license_info.num_extra_lines
+        + fuzzy_match_extra_lines_to_check
     )
-    expected_num_tokens = len(license_string.split(" "))
+    # Lines are stripped & classified once, then shared by all the overlapping candidates:
+    candidate_lines = classify_candidate_lines(
+        src_file_content[: top_lines_count + candidate_length], license_info
+    )
+    # Distinct offsets often lead to the same candidate, that is only scored once:
+    ratio_per_candidate: dict[str, float] = {}
     for i in range(top_lines_count):
-        candidate_array = src_file_content[
-            i : i
-            + len(license_info.plain_license)
-            + license_info.num_extra_lines
-            + fuzzy_match_extra_lines_to_check
-        ]
-        license_string_candidate, candidate_offset = get_license_candidate_string(
-            candidate_array, license_info
+        license_string_candidate, candidate_offset = get_license_candidate_from_table(
+            candidate_lines[i : i + candidate_length], license_info
         )
-        ratio = fuzz.token_set_ratio(license_string, license_string_candidate)
+        ratio = ratio_per_candidate.get(license_string_candidate, -1)
+        if ratio < 0:
+            ratio = 0
+            # Most files have no comment block matching the license at their top:
+            # rapidfuzz is only called if the cut-off ratio can be reached.
+            if (
+                _token_set_ratio_upper_bound(
+                    fuzzy_license.tokens, _fuzzy_tokens(license_string_candidate)
+                )
+                >= fuzzy_ratio_cut_off
+            ):
+                from rapidfuzz import fuzz
+
+                ratio = fuzz.token_set_ratio(
+                    license_string,
+                    license_string_candidate,
+                    score_cutoff=fuzzy_ratio_cut_off,
+                )
+            ratio_per_candidate[license_string_candidate] = ratio
         num_tokens = len(license_string_candidate.split(" "))
         num_tokens_diff = abs(num_tokens - expected_num_tokens)
         if DEBUG_LEVENSHTEIN_DISTANCE_CALCULATION:  # pragma: no cover
@@ -652,59 +1559,151 @@ def fuzzy_find_license_header_index(
     return best_line_number_match
 
 
-def get_license_candidate_string(candidate_array, license_info):
+def get_fuzzy_license(plain_license) -> FuzzyLicense:
     """
-    Return license candidate string from the array of strings retrieved
-    :param candidate_array: array of lines of the candidate strings
-    :param license_info: LicenseInfo named tuple containing information about the license
-    :return: Tuple of string version of the license candidate and offset in lines where it starts.
+    Pre-computes the license string compared to license candidates by fuzzy matching
     """
-    license_string_candidate = ""
-    stripped_comment_start = (
-        license_info.comment_start.strip() if license_info.comment_start else ""
+    license_string = " ".join(plain_license).replace("\n", "").replace("\r", "").strip()
+    return FuzzyLicense(
+        string=license_string,
+        tokens=_fuzzy_tokens(license_string),
+        num_tokens=len(license_string.split(" ")),
     )
-    stripped_comment_prefix = (
-        license_info.comment_prefix.strip() if license_info.comment_prefix else ""
+
+
+# rapidfuzz splits tokens on the characters of str.isspace(), except on \x85 and \xa0
+# in the strings that only contain Latin-1 characters:
+_LATIN1_FUZZY_TOKENS_SEPARATOR = re.compile("[\t\n\x0b\x0c\r\x1c-\x1f ]+")
+
+
+def _fuzzy_tokens(string) -> frozenset:
+    """
+    Returns the set of tokens of a string, split like fuzz.token_set_ratio does
+    """
+    if ("\x85" in string or "\xa0" in string) and max(string) < "\u0100":
+        return frozenset(_LATIN1_FUZZY_TOKENS_SEPARATOR.split(string)) - {""}
+    return frozenset(string.split())
+
+
+def _token_set_ratio_upper_bound(tokens_a, tokens_b) -> float:
+    """
+    Returns an upper bound of fuzz.token_set_ratio, computed from the sets of tokens only.
+    It follows the rapidfuzz implementation, where this ratio is the maximum of:
+    - the Indel ratio between the tokens specific to each string, that is bounded
+      as the Indel distance cannot be lower than the difference of their lengths,
+    - the ratios between the common tokens and each string, that only depend on lengths.
+    """
+    if not tokens_a or not tokens_b:
+        return 0
+    intersection = tokens_a & tokens_b
+    diff_ab = tokens_a - tokens_b
+    diff_ba = tokens_b - tokens_a
+    if intersection and (not diff_ab or not diff_ba):
+        return 100
+
+    def joined_len(tokens):
+        return sum(map(len, tokens)) + len(tokens) - 1 if tokens else 0
+
+    ab_len, ba_len, sect_len = (
+        joined_len(diff_ab),
+        joined_len(diff_ba),
+        joined_len(intersection),
     )
-    stripped_comment_end = (
-        license_info.comment_end.strip() if license_info.comment_end else ""
+    separator_len = 1 if sect_len else 0
+    sect_ab_len = sect_len + separator_len + ab_len
+    sect_ba_len = sect_len + separator_len + ba_len
+    upper_bound = 100 - 100 * abs(ab_len - ba_len) / (sect_ab_len + sect_ba_len)
+    if sect_len:
+        upper_bound = max(
+            upper_bound,
+            100 - 100 * (separator_len + ab_len) / (sect_len + sect_ab_len),
+            100 - 100 * (separator_len + ba_len) / (sect_len + sect_ba_len),
+        )
+    return upper_bound
+
+
+CandidateLine = collections.namedtuple(
+    "CandidateLine",
+    ["stripped", "is_comment_start", "has_comment_prefix", "is_comment_end"],
+)
+
+
+def _stripped_comment_markers(license_info) -> tuple[str, str, str]:
+    return (
+        license_info.comment_start.strip() if license_info.comment_start else "",
+        license_info.comment_prefix.strip() if license_info.comment_prefix else "",
+        license_info.comment_end.strip() if license_info.comment_end else "",
     )
+
+
+def classify_candidate_lines(lines, license_info) -> list[CandidateLine]:
+    """
+    Strips every line once, and detects if it starts with each comment marker of the license,
+    so that all the license candidates overlapping those lines can be built from this table.
+    """
+    comment_start, comment_prefix, comment_end = _stripped_comment_markers(license_info)
+    table = []
+    for line in lines:
+        stripped_line = line.strip()
+        table.append(
+            CandidateLine(
+                stripped=stripped_line,
+                is_comment_start=bool(comment_start)
+                and stripped_line.startswith(comment_start),
+                has_comment_prefix=bool(comment_prefix)
+                and stripped_line.startswith(comment_prefix),
+                is_comment_end=bool(comment_end)
+                and stripped_line.startswith(comment_end),
+            )
+        )
+    return table
+
+
+def get_license_candidate_from_table(candidate_lines, license_info):
+    """
+    Return license candidate string from lines classified by classify_candidate_lines
+    :param candidate_lines: CandidateLine of the candidate strings
+    :param license_info: LicenseInfo named tuple containing information about the license
+    :return: Tuple of string version of the license candidate and offset in lines where it starts.
+    """
+    comment_start, comment_prefix, _ = _stripped_comment_markers(license_info)
+    candidate_parts = []
     in_license = False
-    current_offset = 0
     found_license_offset = 0
-    for license_line in candidate_array:
-        stripped_line = license_line.strip()
+    for current_offset, line in enumerate(candidate_lines):
         if not in_license:
-            if stripped_comment_start:
-                if stripped_line.startswith(stripped_comment_start):
+            if comment_start:
+                if line.is_comment_start:
                     in_license = True
-                    found_license_offset = (
-                        current_offset + 1
-                    )  # License starts in the next line
+                    # License starts in the next line:
+                    found_license_offset = current_offset + 1
                     continue
-            else:
-                if stripped_comment_prefix:
-                    if stripped_line.startswith(stripped_comment_prefix):
-                        in_license = True
-                        found_license_offset = (
-                            current_offset  # License starts in this line
-                        )
-                else:
+            elif comment_prefix:
+                if line.has_comment_prefix:
                     in_license = True
-                    # We have no data :(. We start license immediately
+                    # License starts in this line:
                     found_license_offset = current_offset
-        else:
-            if stripped_comment_end and stripped_line.startswith(stripped_comment_end):
-                break
-        if in_license and (
-            not stripped_comment_prefix
-            or stripped_line.startswith(stripped_comment_prefix)
-        ):
-            license_string_candidate += (
-                stripped_line[len(stripped_comment_prefix) :] + " "
-            )
-        current_offset += 1
-    return license_string_candidate.strip(), found_license_offset
+            else:
+                in_license = True
+                # We have no data :(. We start license immediately
+                found_license_offset = current_offset
+        elif line.is_comment_end:
+            break
+        if in_license and (not comment_prefix or line.has_comment_prefix):
+            candidate_parts.append(line.stripped[len(comment_prefix) :])
+    return " ".join(candidate_parts).strip(), found_license_offset
+
+
+def get_license_candidate_string(candidate_array, license_info):
+    """
+    Return license candidate string from the array of strings retrieved
+    :param candidate_array: array of lines of the candidate strings
+    :param license_info: LicenseInfo named tuple containing information about the license
+    :return: Tuple of string version of the license candidate and offset in lines where it starts.
+    """
+    return get_license_candidate_from_table(
+        classify_candidate_lines(candidate_array, license_info), license_info
+    )
 
 
 if __name__ == "__main__":
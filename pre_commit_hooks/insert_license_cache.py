@@ -0,0 +1,105 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+import time
+
+from pre_commit_hooks.atomic_write import atomic_write
+
+# Cache files that have not been used for this duration are deleted:
+STALE_CACHE_FILE_AGE_IN_SECONDS = 30 * 24 * 3600
+
+
+def default_cache_dir() -> str:
+    return os.path.join(
+        os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+        "pre-commit-hooks",
+    )
+
+
+def fingerprint(*values) -> str:
+    """
+    Returns a digest of JSON-serializable values, that changes whenever one of them changes.
+    """
+    payload = json.dumps(values, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf8")).hexdigest()[:32]
+
+
+class VerdictCache:
+    """
+    On-disk cache of the verdicts of the insert-license hook on files that it did not modify.
+    Verdicts are keyed by a digest of the file content, and stored in a JSON file named after
+    a fingerprint of everything else they depend on: hook arguments, licenses, current year...
+    so that any change to those invalidates the cache.
+    The least recently used verdicts are evicted once max_entries is reached.
+    """
+
+    def __init__(self, cache_dir: str, cache_fingerprint: str, max_entries: int):
+        self.cache_dir = cache_dir
+        self.filepath = os.path.join(
+            cache_dir, f"insert_license-{cache_fingerprint}.json"
+        )
+        self.max_entries = max_entries
+        self.verdicts = self._load()
+        # Verdicts set or retrieved during this run, in the order they were used:
+        self.updates: dict[str, str] = {}
+
+    def _load(self) -> dict[str, str]:
+        try:
+            with open(self.filepath, encoding="utf8") as cache_file:
+                verdicts = json.load(cache_file)
+        except (OSError, ValueError):
+            return {}
+        return verdicts if isinstance(verdicts, dict) else {}
+
+    @staticmethod
+    def content_digest(lines: list[bytes]) -> str:
+        return hashlib.sha256(b"".join(lines)).hexdigest()
+
+    def get(self, digest: str) -> str | None:
+        verdict = self.verdicts.get(digest)
+        if verdict is not None:
+            self.updates[digest] = verdict
+        return verdict
+
+    def set(self, digest: str, verdict: str):
+        self.verdicts[digest] = verdict
+        self.updates[digest] = verdict
+
+    def pop_updates(self) -> dict[str, str]:
+        updates, self.updates = self.updates, {}
+        return updates
+
+    def merge_updates(self, updates: dict[str, str]):
+        self.verdicts.update(updates)
+        self.updates.update(updates)
+
+    def save(self):
+        if not self.updates:
+            return
+        # Reloading the file, in order to keep verdicts saved meanwhile by concurrent runs:
+        verdicts = self._load()
+        for digest, verdict in self.updates.items():
+            verdicts.pop(digest, None)  # moving it to the end, as most recently used
+            verdicts[digest] = verdict
+        if len(verdicts) > self.max_entries:
+            verdicts = dict(list(verdicts.items())[len(verdicts) - self.max_entries :])
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with atomic_write(self.filepath) as cache_file:
+            cache_file.write(json.dumps(verdicts).encode("utf8"))
+        self.updates = {}
+        self._remove_stale_cache_files()
+
+    def _remove_stale_cache_files(self):
+        now = time.time()
+        for filename in os.listdir(self.cache_dir):
+            filepath = os.path.join(self.cache_dir, filename)
+            if not (
+                filename.startswith("insert_license-") and filename.endswith(".json")
+            ):
+                continue
+            try:
+                if now - os.stat(filepath).st_mtime > STALE_CACHE_FILE_AGE_IN_SECONDS:
+                    os.remove(filepath)
+            except OSError:  # it may have been removed concurrently
+                pass
@@ -0,0 +1,58 @@
+from __future__ import annotations
+import json
+import os
+import socket
+import sys
+
+CONNECT_TIMEOUT_IN_SECONDS = 1
+
+
+def hook_version() -> list:
+    """
+    Identifies the code of the hooks, so that a server never processes files
+    on behalf of another version of them, e.g. installed in another pre-commit environment.
+    """
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    return [
+        package_dir,
+        max(
+            os.stat(os.path.join(package_dir, filename)).st_mtime_ns
+            for filename in os.listdir(package_dir)
+            if filename.endswith(".py")
+        ),
+    ]
+
+
+def run_in_server(socket_path: str, argv: list[str]) -> int | None:
+    """
+    Forwards a run of the hook to the server listening on socket_path,
+    and outputs what the hook printed.
+    :return: the return code of the hook, or None if it could not be run by the server
+    """
+    request = {
+        "argv": argv,
+        "cwd": os.getcwd(),
+        # Not only INSERT_LICENSE_* variables configure the hook, but also HOME, XDG_*, GIT_*...:
+        "env": dict(os.environ),
+        "version": hook_version(),
+    }
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(CONNECT_TIMEOUT_IN_SECONDS)
+            client.connect(socket_path)
+            client.settimeout(None)
+            client.sendall(json.dumps(request).encode("utf8") + b"\n")
+            with client.makefile("rb") as response_file:
+                response = json.loads(response_file.readline())
+    except AttributeError:  # no Unix sockets on this platform
+        return None
+    except (OSError, ValueError):  # e.g. the server is not running anymore
+        return None
+    if "error" in response:
+        print(
+            f"Ignoring the insert-license server: {response['error']}", file=sys.stderr
+        )
+        return None
+    print(response["stdout"], end="")
+    print(response["stderr"], end="", file=sys.stderr)
+    return response["return_code"]
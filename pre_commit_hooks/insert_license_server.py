@@ -0,0 +1,206 @@
+from __future__ import annotations
+import argparse
+import contextlib
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import traceback
+
+from pre_commit_hooks import insert_license
+from pre_commit_hooks.insert_license_client import (
+    CONNECT_TIMEOUT_IN_SECONDS,
+    hook_version,
+)
+
+
+class LicenseCheckServer(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+    """
+    Long-lived process running the insert-license hook on behalf of its clients,
+    that reuses the licenses loaded, and the modules imported, by the previous runs.
+    Each run is processed by a forked child process, that inherits them:
+    concurrent runs, like the batches of files spread by pre-commit across CPUs, are processed in parallel,
+    and each child can change its current directory & environment without affecting the others.
+    """
+
+    # pre-commit can start as many runs of the hook at once as there are CPUs:
+    request_queue_size = socket.SOMAXCONN
+
+    def __init__(self, socket_path: str):
+        self.version = hook_version()
+        # Licenses loaded, by working directory, year, arguments and state of the license files:
+        self.license_info_lists: dict[str, list[insert_license.LicenseInfo]] = {}
+        # Request of the client being processed, read before forking the child process:
+        self.client_request: dict | None = None
+        super().__init__(socket_path, _RequestHandler)
+
+    def process_request(self, request, client_address):
+        """
+        Reads the request of a client, and loads the licenses it needs,
+        before forking the child process that runs the hook:
+        as they are loaded by the server itself, those licenses are reused by the next children.
+        """
+        request.settimeout(CONNECT_TIMEOUT_IN_SECONDS)
+        try:
+            with request.makefile("rb") as request_file:
+                request_line = request_file.readline()
+            self.client_request = json.loads(request_line) if request_line else None
+        except (OSError, ValueError):
+            self.client_request = None
+        request.settimeout(None)
+        if self.client_request and self.client_request.get("version") == self.version:
+            self._load_licenses(self.client_request)
+        super().process_request(request, client_address)
+
+    def _load_licenses(self, request: dict):
+        output = io.StringIO()
+        try:
+            with _client_context(request), contextlib.redirect_stdout(
+                output
+            ), contextlib.redirect_stderr(output):
+                args = insert_license.parse_args(request["argv"])
+                insert_license.complete_license_args(args)
+                self.get_license_info_list(args)
+        # Errors are reported to the client by the child process, when running the hook:
+        except (SystemExit, Exception):  # pylint: disable=broad-exception-caught
+            pass
+
+    def process(self, request: dict) -> dict:
+        """
+        :param request: dict with the argv, cwd & env of a client, and the version of its code
+        :return: dict with the return code of the hook, and what it printed on stdout & stderr
+        """
+        if request.get("version") != self.version:
+            return {
+                "error": "the server runs another version of the insert-license hook"
+            }
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with _client_context(request):
+            with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                return_code = self._run(request["argv"])
+        return {
+            "return_code": return_code,
+            "stdout": stdout.getvalue(),
+            "stderr": stderr.getvalue(),
+        }
+
+    def _run(self, argv: list[str]) -> int:
+        try:
+            return insert_license.run(argv, self.get_license_info_list)
+        except SystemExit as exc:  # raised by argparse
+            return exc.code if isinstance(exc.code, int) else 1
+        except Exception:  # pylint: disable=broad-exception-caught
+            traceback.print_exc()
+            return 1
+
+    def get_license_info_list(self, args) -> list[insert_license.LicenseInfo]:
+        key = json.dumps(
+            [
+                os.getcwd(),
+                insert_license._current_year(),  # pylint: disable=protected-access
+                insert_license.cache_sensitive_args(args),
+                [_file_state(filepath) for filepath in args.license_filepath],
+            ]
+        )
+        if key not in self.license_info_lists:
+            self.license_info_lists[key] = insert_license.get_license_info_list(args)
+        return self.license_info_lists[key]
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        request = self.server.client_request  # type: ignore[attr-defined]
+        if not request:  # the client only checked that the server is listening
+            return
+        response = self.server.process(request)  # type: ignore[attr-defined]
+        self.wfile.write(json.dumps(response).encode("utf8") + b"\n")
+
+
+@contextlib.contextmanager
+def _client_context(request: dict):
+    """
+    Runs code in the current directory, and with the environment variables, of a client.
+    """
+    initial_cwd, initial_env = os.getcwd(), dict(os.environ)
+    try:
+        os.chdir(request["cwd"])
+        os.environ.clear()
+        os.environ.update(request["env"])
+        yield
+    finally:
+        os.chdir(initial_cwd)
+        os.environ.clear()
+        os.environ.update(initial_env)
+
+
+def _file_state(filepath: str):
+    try:
+        stat = os.stat(filepath)
+    except OSError:
+        return None
+    return [os.path.abspath(filepath), stat.st_mtime_ns, stat.st_size]
+
+
+def _is_listening(socket_path: str) -> bool:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        try:
+            client.connect(socket_path)
+        except OSError:
+            return False
+    return True
+
+
+def serve(socket_path: str):
+    """
+    Processes the runs of the hook forwarded to socket_path, until interrupted or terminated.
+    """
+    signal.signal(signal.SIGTERM, _raise_keyboard_interrupt)
+    socket_dir = os.path.dirname(socket_path)
+    if socket_dir:
+        os.makedirs(socket_dir, mode=0o700, exist_ok=True)
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(socket_path)  # left by a server that did not exit cleanly
+    with LicenseCheckServer(socket_path) as server:
+        os.chmod(socket_path, 0o600)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(socket_path)
+
+
+def _raise_keyboard_interrupt(*_):
+    raise KeyboardInterrupt
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Runs the insert-license hook on behalf of its next invocations,"
+        " so that they do not have to load the licenses & import modules again."
+        " Each run of the hook is processed by a forked child process."
+    )
+    parser.add_argument(
+        "--socket",
+        default=insert_license.server_socket_path(),
+        help="path of the Unix socket to listen on."
+        f" Defaults to the one the hook connects to, that can be set with ${insert_license.SERVER_SOCKET_ENV_VAR}",
+    )
+    args = parser.parse_args(argv)
+    if not hasattr(socket, "AF_UNIX"):
+        print("Unix sockets are not supported on this platform")
+        return 1
+    if _is_listening(args.socket):
+        print(f"A server is already listening on {args.socket}")
+        return 1
+    print(f"Listening on {args.socket}")
+    serve(args.socket)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))  # pragma: no cover
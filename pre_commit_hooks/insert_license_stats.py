@@ -0,0 +1,139 @@
+from __future__ import annotations
+import collections
+import contextlib
+import heapq
+import json
+import sys
+import time
+
+# Phases of the processing of a file, in the order they are reported:
+PHASE_READ = "read"
+PHASE_COMMENTS_SEARCH = "comments_search"
+PHASE_EXACT_MATCH = "exact_match"
+PHASE_DECODE = "decode"
+PHASE_FUZZY_MATCH = "fuzzy_match"
+PHASE_REWRITE = "rewrite"
+PHASES = (
+    PHASE_READ,
+    PHASE_COMMENTS_SEARCH,
+    PHASE_EXACT_MATCH,
+    PHASE_DECODE,
+    PHASE_FUZZY_MATCH,
+    PHASE_REWRITE,
+)
+
+DEFAULT_SLOWEST_FILES_COUNT = 10
+
+
+class Stats:
+    """
+    Time spent & number of calls per phase of the insert-license hook, counters of events,
+    and the files that took the longest to process.
+    Stats collected by worker processes are sent back to the main process with pop_updates,
+    then merged with merge_updates, like the updates of the verdicts cache.
+    """
+
+    def __init__(self, slowest_files_count: int = DEFAULT_SLOWEST_FILES_COUNT):
+        self.slowest_files_count = slowest_files_count
+        self.phases: dict[str, list[float]] = {}  # name -> [calls, seconds]
+        self.counters: collections.Counter[str] = collections.Counter()
+        self.slowest_files: list[tuple[float, str]] = []  # heap of (seconds, filepath)
+        self.start_time = time.perf_counter()
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._add_phase(name, 1, time.perf_counter() - start)
+
+    @contextlib.contextmanager
+    def file(self, filepath: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.counters["files"] += 1
+            self._add_file(time.perf_counter() - start, filepath)
+
+    def count(self, name: str, increment: int = 1):
+        self.counters[name] += increment
+
+    def _add_phase(self, name: str, calls: float, seconds: float):
+        phase = self.phases.setdefault(name, [0, 0.0])
+        phase[0] += calls
+        phase[1] += seconds
+
+    def _add_file(self, seconds: float, filepath: str):
+        if len(self.slowest_files) < self.slowest_files_count:
+            heapq.heappush(self.slowest_files, (seconds, filepath))
+        else:
+            heapq.heappushpop(self.slowest_files, (seconds, filepath))
+
+    def pop_updates(self) -> dict:
+        updates = {
+            "phases": self.phases,
+            "counters": dict(self.counters),
+            "slowest_files": self.slowest_files,
+        }
+        self.phases, self.counters, self.slowest_files = {}, collections.Counter(), []
+        return updates
+
+    def merge_updates(self, updates: dict):
+        for name, (calls, seconds) in updates["phases"].items():
+            self._add_phase(name, calls, seconds)
+        self.counters.update(updates["counters"])
+        for seconds, filepath in updates["slowest_files"]:
+            self._add_file(seconds, filepath)
+
+    def as_dict(self) -> dict:
+        return {
+            "total_seconds": time.perf_counter() - self.start_time,
+            "phases": {
+                name: {"calls": int(calls), "seconds": seconds}
+                for name, (calls, seconds) in sorted(
+                    self.phases.items(), key=lambda item: _phase_rank(item[0])
+                )
+            },
+            "counters": dict(sorted(self.counters.items())),
+            "slowest_files": [
+                {"filepath": filepath, "seconds": seconds}
+                for seconds, filepath in sorted(self.slowest_files, reverse=True)
+            ],
+        }
+
+    def report(self, summary: bool, json_filepath: str | None = None):
+        """
+        :param summary: whether to print a summary of the stats on stderr
+        :param json_filepath: if provided, the stats are also stored in this file, as JSON
+        """
+        stats = self.as_dict()
+        if json_filepath:
+            with open(json_filepath, "w", encoding="utf8") as json_file:
+                json.dump(stats, json_file, indent=2)
+        if not summary:
+            return
+        print(
+            f"insert-license stats: {stats['counters'].get('files', 0)} files"
+            f" processed in {stats['total_seconds']:.3f}s",
+            file=sys.stderr,
+        )
+        for name, phase in stats["phases"].items():
+            print(
+                f"  {name:<16}{phase['calls']:>8} calls{phase['seconds']:>10.3f}s",
+                file=sys.stderr,
+            )
+        for name, value in stats["counters"].items():
+            print(f"  {name:<16}{value:>8}", file=sys.stderr)
+        if stats["slowest_files"]:
+            print("  Slowest files:", file=sys.stderr)
+        for slow_file in stats["slowest_files"]:
+            print(
+                f"  {slow_file['seconds']:>10.3f}s {slow_file['filepath']}",
+                file=sys.stderr,
+            )
+
+
+def _phase_rank(name: str) -> int:
+    return PHASES.index(name) if name in PHASES else len(PHASES)
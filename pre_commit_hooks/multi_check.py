@@ -0,0 +1,131 @@
+import argparse, sys
+
+from pre_commit_hooks import git_blobs
+from pre_commit_hooks.forbid_crlf import chunks_contain_crlf
+from pre_commit_hooks.forbid_tabs import chunks_contain_tabs
+from pre_commit_hooks.insert_license import (
+    LicenseIndex,
+    add_license_arguments,
+    init_license_check,
+    process_file,
+    record_status,
+    report_license_check,
+)
+
+
+class LicenseCheck:
+    """
+    Runs the insert-license hook file by file, on contents that have already been read.
+    """
+
+    def __init__(self, args):
+        self.args = args
+        license_info_list, self.verdict_cache, self.stats = init_license_check(args)
+        self.license_index = LicenseIndex(license_info_list)
+        self.changed_files: list[str] = []
+        self.todo_files: list[str] = []
+        self.license_update_failed = False
+
+    def check(self, filename, content):
+        status = process_file(
+            self.args,
+            filename,
+            self.license_index,
+            self.verdict_cache,
+            src_file_bytes=content,
+            stats=self.stats,
+        )
+        if record_status(filename, status, self.changed_files, self.todo_files):
+            self.license_update_failed = True
+
+    def report(self):
+        if self.verdict_cache:
+            self.verdict_cache.save()
+        if self.stats:
+            self.stats.report(
+                summary=self.args.stats, json_filepath=self.args.stats_json
+            )
+        return report_license_check(
+            self.changed_files or self.todo_files or self.license_update_failed,
+            self.changed_files,
+            self.todo_files,
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Runs several checks on files, reading each of them only once."
+        " Files are processed sequentially, so --jobs is ignored."
+    )
+    parser.add_argument("filenames", nargs="*", help="filenames to check")
+    parser.add_argument(
+        "--crlf", action="store_true", help="same check as the forbid-crlf hook"
+    )
+    parser.add_argument(
+        "--tabs", action="store_true", help="same check as the forbid-tabs hook"
+    )
+    parser.add_argument(
+        "--license",
+        action="store_true",
+        help="same processing as the insert-license hook, configured with the options below",
+    )
+    git_source = parser.add_mutually_exclusive_group()
+    git_source.add_argument(
+        "--staged",
+        action="store_true",
+        help="check the content of the files staged in the git index, instead of the working tree."
+        " When no filenames are provided, all the files in the index are checked",
+    )
+    git_source.add_argument(
+        "--git-rev",
+        help="check the content of the files in this git revision, instead of the working tree."
+        " When no filenames are provided, all the files in this revision are checked."
+        " With a revision range like A..B, the contents added or modified by the commits in this range are checked",
+    )
+    add_license_arguments(parser)
+    args = parser.parse_args(argv)
+    if not (args.crlf or args.tabs or args.license):
+        parser.error("at least one of --crlf, --tabs or --license is required")
+    if args.staged or args.git_rev:
+        args.check_only = True  # git objects can not be modified
+    license_check = LicenseCheck(args) if args.license else None
+    return_code = 0
+    for filename, content in _file_contents(args):
+        if args.crlf and chunks_contain_crlf((content,)):
+            print(f"CRLF end-lines detected in file: {filename}")
+            return_code = 1
+        if args.tabs and chunks_contain_tabs((content,)):
+            print(f"Tabs detected in file: {filename}")
+            return_code = 1
+        if license_check:
+            license_check.check(filename, content)
+    if license_check:
+        return_code = max(return_code, license_check.report())
+    return return_code
+
+
+def _file_contents(args):
+    """
+    Yields the filenames to check, with their content,
+    read from the working tree, or from git objects with --staged or --git-rev.
+    A file modified by several commits of a --git-rev range is yielded for each of its distinct contents.
+    """
+    if args.git_rev and ".." in args.git_rev:
+        blobs = git_blobs.read_objects(
+            git_blobs.changed_blobs(args.git_rev, args.filenames)
+        )
+    elif args.staged or args.git_rev:
+        rev = args.git_rev or git_blobs.INDEX_REV
+        blobs = git_blobs.read_blobs(args.filenames or git_blobs.list_paths(rev), rev)
+    else:
+        for filename in args.filenames:
+            with open(filename, mode="rb") as file_checked:
+                yield filename, file_checked.read()
+        return
+    for path, content in blobs:
+        if content is not None:
+            yield path, content
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))  # pragma: no cover
@@ -1,31 +1,63 @@
 import argparse, sys
 
+from pre_commit_hooks.atomic_write import atomic_write, copy_bytes
+from pre_commit_hooks.forbid_crlf import CHUNK_SIZE
 
-def contains_crlf(filename):
-    with open(filename, mode="rb") as file_checked:
-        for line in file_checked.readlines():
-            if line.endswith(b"\r\n"):
-                return True
-    return False
+# Kept importable from this module, as it used to be defined here:
+from pre_commit_hooks.forbid_crlf import contains_crlf  # pylint: disable=unused-import
 
 
-def removes_crlf_in_file(filename):
+def removes_crlf_in_file(filename, chunk_size=CHUNK_SIZE, fsync=False):
+    """
+    Replaces CRLF end-lines by LF ones in a single pass: the file is scanned by chunks,
+    and only once a CRLF is found, the rest of it is converted while streamed to a temporary file,
+    that then replaces the original one.
+    :param fsync: whether to flush the modified file to the disk
+    :return: True if CRLF end-lines were found and removed, False otherwise
+    """
     with open(filename, mode="rb") as file_processed:
-        lines = file_processed.readlines()
-    lines = [line.replace(b"\r\n", b"\n") for line in lines]
-    with open(filename, mode="wb") as file_processed:
-        for line in lines:
-            file_processed.write(line)
+        clean_prefix_size = 0
+        previous_chunk_ends_with_cr = False
+        for chunk in iter(lambda: file_processed.read(chunk_size), b""):
+            if b"\r\n" in chunk or (
+                previous_chunk_ends_with_cr and chunk.startswith(b"\n")
+            ):
+                break
+            clean_prefix_size += len(chunk)
+            previous_chunk_ends_with_cr = chunk.endswith(b"\r")
+        else:
+            return False
+    # The CR ending the clean prefix, if any, may be part of a CRLF:
+    pending_cr = b"\r" if previous_chunk_ends_with_cr else b""
+    with atomic_write(filename, fsync=fsync) as tmp_file, open(
+        filename, mode="rb"
+    ) as src_file:
+        copy_bytes(src_file, tmp_file, clean_prefix_size - len(pending_cr), chunk_size)
+        src_file.seek(clean_prefix_size)
+        for chunk in iter(lambda: src_file.read(chunk_size), b""):
+            chunk = pending_cr + chunk
+            pending_cr = b"\r" if chunk.endswith(b"\r") else b""
+            if pending_cr:
+                chunk = chunk[:-1]
+            tmp_file.write(chunk.replace(b"\r\n", b"\n"))
+        tmp_file.write(pending_cr)
+    return True
 
 
 def main(argv=None):
     parser = argparse.ArgumentParser()
     parser.add_argument("filenames", nargs="*", help="filenames to check")
+    parser.add_argument(
+        "--fsync",
+        action="store_true",
+        help="Flush modified files to the disk before exiting, for durability-sensitive environments",
+    )
     args = parser.parse_args(argv)
-    files_with_crlf = [f for f in args.filenames if contains_crlf(f)]
-    for file_with_crlf in files_with_crlf:
-        print(f"Removing CRLF end-lines in: {file_with_crlf}")
-        removes_crlf_in_file(file_with_crlf)
+    files_with_crlf = []
+    for filename in args.filenames:
+        if removes_crlf_in_file(filename, fsync=args.fsync):
+            print(f"Removing CRLF end-lines in: {filename}")
+            files_with_crlf.append(filename)
     if files_with_crlf:
         print("")
         print("CRLF end-lines have been successfully removed. Now aborting the commit.")
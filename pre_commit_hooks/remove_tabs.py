@@ -1,18 +1,42 @@
 import argparse, sys
 
+from pre_commit_hooks.atomic_write import atomic_write
+from pre_commit_hooks.forbid_tabs import CHUNK_SIZE, contains_tabs
 
-def contains_tabs(filename):
-    with open(filename, mode="rb") as file_checked:
-        return b"\t" in file_checked.read()
 
+def removes_tabs_in_file(
+    filename, whitespaces_count, chunk_size=CHUNK_SIZE, fsync=False
+):
+    """
+    Replaces tabs by whitespaces, with the same result as bytes.expandtabs on the whole file,
+    but streaming it by chunks to a temporary file, that then replaces the original one.
+    :param fsync: whether to flush the modified file to the disk
+    """
+    column = 0  # in the output, at the end of the chunks processed so far
+    with atomic_write(filename, fsync=fsync) as tmp_file, open(
+        filename, mode="rb"
+    ) as src_file:
+        for chunk in iter(lambda: src_file.read(chunk_size), b""):
+            expanded_chunk = _expand_tabs(chunk, column, whitespaces_count)
+            tmp_file.write(expanded_chunk)
+            # There are no more tabs, so each byte after the last end-line is a column:
+            last_eol = max(expanded_chunk.rfind(b"\n"), expanded_chunk.rfind(b"\r"))
+            if last_eol >= 0:
+                column = len(expanded_chunk) - last_eol - 1
+            else:
+                column += len(expanded_chunk)
 
-def removes_tabs_in_file(filename, whitespaces_count):
-    with open(filename, mode="rb") as file_processed:
-        lines = file_processed.readlines()
-    lines = [line.expandtabs(whitespaces_count) for line in lines]
-    with open(filename, mode="wb") as file_processed:
-        for line in lines:
-            file_processed.write(line)
+
+def _expand_tabs(chunk, column, tabsize):
+    """
+    Expands tabs in a chunk whose first line starts at the given column.
+    """
+    if b"\t" not in chunk:
+        return chunk
+    # Tab stops only depend on the column modulo the tab size,
+    # so the first line is shifted by the corresponding number of placeholder bytes:
+    shift = column % tabsize if tabsize > 0 else 0
+    return (b" " * shift + chunk).expandtabs(tabsize)[shift:]
 
 
 def main(argv=None):
@@ -24,13 +48,18 @@ def main(argv=None):
         help="number of whitespaces to substitute tabs with",
     )
     parser.add_argument("filenames", nargs="*", help="filenames to check")
+    parser.add_argument(
+        "--fsync",
+        action="store_true",
+        help="Flush modified files to the disk before exiting, for durability-sensitive environments",
+    )
     args = parser.parse_args(argv)
     files_with_tabs = [f for f in args.filenames if contains_tabs(f)]
     for file_with_tabs in files_with_tabs:
         print(
             f"Substituting tabs in: {file_with_tabs} by {args.whitespaces_count} whitespaces"
         )
-        removes_tabs_in_file(file_with_tabs, args.whitespaces_count)
+        removes_tabs_in_file(file_with_tabs, args.whitespaces_count, fsync=args.fsync)
     if files_with_tabs:
         print("")
         print("Tabs have been successfully removed. Now aborting the commit.")
@@ -19,9 +19,9 @@ setup(
         "Programming Language :: Python :: Implementation :: CPython",
         "Programming Language :: Python :: Implementation :: PyPy",
     ],
-    packages=find_packages("."),
+    packages=find_packages(".", exclude=["benchmarks*"]),
     install_requires=[
-        "rapidfuzz",
+        "rapidfuzz>=3.0.0",
     ],
     entry_points={
         "console_scripts": [
@@ -29,6 +29,8 @@ setup(
             "forbid_crlf = pre_commit_hooks.forbid_crlf:main",
             "forbid_tabs = pre_commit_hooks.forbid_tabs:main",
             "insert_license = pre_commit_hooks.insert_license:main",
+            "insert_license_server = pre_commit_hooks.insert_license_server:main",
+            "lucas_c_hooks_check = pre_commit_hooks.multi_check:main",
             "remove_crlf = pre_commit_hooks.remove_crlf:main",
             "remove_tabs = pre_commit_hooks.remove_tabs:main",
         ],
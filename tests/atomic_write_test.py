@@ -0,0 +1,89 @@
+import os
+import sys
+
+import pytest
+
+from pre_commit_hooks.atomic_write import atomic_write, splice_file
+from pre_commit_hooks.insert_license import main as insert_license
+from pre_commit_hooks.remove_tabs import main as remove_tabs
+
+from .utils import chdir_to_test_resources
+
+
+def test_interrupted_write_keeps_original_file(tmpdir):
+    path = tmpdir.join("file.txt")
+    path.write_binary(b"original")
+    with pytest.raises(KeyboardInterrupt):
+        with atomic_write(path.strpath) as tmp_file:
+            tmp_file.write(b"partial")
+            raise KeyboardInterrupt
+    assert path.read_binary() == b"original"
+    assert os.listdir(tmpdir.strpath) == ["file.txt"]
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="permissions are not supported")
+def test_new_file_is_private(tmpdir):
+    path = tmpdir.join("new.txt")
+    with atomic_write(path.strpath) as tmp_file:
+        tmp_file.write(b"a\nb\n")
+    assert path.read_binary() == b"a\nb\n"
+    assert os.stat(path.strpath).st_mode & 0o777 == 0o600
+
+
+@pytest.mark.parametrize("fsync", (False, True))
+def test_fsync(fsync, tmpdir, monkeypatch):
+    synced_fds: list[int] = []
+    monkeypatch.setattr(os, "fsync", synced_fds.append)
+    path = tmpdir.join("file.txt")
+    path.write_binary(b"\tfoo\n")
+    args = ["--whitespaces-count", "4"] + (["--fsync"] if fsync else [])
+    assert remove_tabs(args + [path.strpath]) == 1
+    assert path.read_binary() == b"    foo\n"
+    # The file, then its directory:
+    assert len(synced_fds) == (2 if fsync and hasattr(os, "O_DIRECTORY") else 0)
+
+
+def test_insert_license_fsync(tmpdir, monkeypatch):
+    synced_fds: list[int] = []
+    monkeypatch.setattr(os, "fsync", synced_fds.append)
+    path = tmpdir.join("module.py")
+    with chdir_to_test_resources():
+        with open("module_without_license.py", "rb") as src_file:
+            path.write_binary(src_file.read())
+        args = ["--license-filepath", "LICENSE_with_trailing_newline.txt", "--fsync"]
+        assert insert_license(args + [path.strpath]) == 1
+        with open("module_with_license.py", "rb") as expected_file:
+            assert path.read_binary() == expected_file.read()
+    assert synced_fds
+
+
+@pytest.mark.parametrize("sendfile_supported", (True, False))
+@pytest.mark.parametrize(
+    ("offset", "inserted", "removed_size", "expected"),
+    (
+        (0, b"header\n", 0, b"header\nline 1\nline 2\n"),
+        (7, b"", 7, b"line 1\n"),
+        (7, b"LINE 2\n", 7, b"line 1\nLINE 2\n"),
+        (14, b"line 3\n", 0, b"line 1\nline 2\nline 3\n"),
+    ),
+)
+def test_splice_file(
+    sendfile_supported, offset, inserted, removed_size, expected, tmpdir, monkeypatch
+):
+    if not sendfile_supported:
+        monkeypatch.delattr(os, "sendfile", raising=False)
+    path = tmpdir.join("file.txt")
+    path.write_binary(b"line 1\nline 2\n")
+    splice_file(path.strpath, offset, inserted=inserted, removed_size=removed_size)
+    assert path.read_binary() == expected
+
+
+def test_splice_file_when_sendfile_fails(tmpdir, monkeypatch):
+    def sendfile(*_):
+        raise OSError("Socket operation on non-socket")
+
+    monkeypatch.setattr(os, "sendfile", sendfile, raising=False)
+    path = tmpdir.join("file.txt")
+    path.write_binary(b"line 1\nline 2\n")
+    splice_file(path.strpath, 7, inserted=b"new line\n")
+    assert path.read_binary() == b"line 1\nnew line\nline 2\n"
@@ -0,0 +1,56 @@
+import os
+
+from benchmarks.run import main as run_benchmarks
+from benchmarks.synthetic_repo import LICENSE_FILENAME, RepoSpec, generate_repository
+
+
+def _read_files(root, filenames):
+    contents = []
+    for filename in filenames:
+        with open(os.path.join(root, filename), "rb") as src_file:
+            contents.append(src_file.read())
+    return contents
+
+
+def test_generate_repository(tmpdir):
+    spec = RepoSpec(
+        files_count=40,
+        file_size=300,
+        license_share=1,
+        crlf_share=0.5,
+        tabs_share=0,
+        latin1_share=0,
+        seed=1,
+    )
+    filenames = generate_repository(str(tmpdir), spec)
+    assert len(filenames) == 40
+    assert os.path.isfile(tmpdir.join(LICENSE_FILENAME))
+    contents = _read_files(str(tmpdir), filenames)
+    assert all(len(content) >= 300 for content in contents)
+    assert all(content.startswith(b"# Copyright") for content in contents)
+    assert not any(b"\t" in content for content in contents)
+    assert 0 < sum(b"\r\n" in content for content in contents) < 40
+
+
+def test_generate_repository_is_deterministic(tmpdir):
+    spec = RepoSpec(files_count=10, file_size=200, seed=3)
+    filenames = generate_repository(str(tmpdir.mkdir("a")), spec)
+    assert filenames == generate_repository(str(tmpdir.mkdir("b")), spec)
+    assert _read_files(str(tmpdir.join("a")), filenames) == _read_files(
+        str(tmpdir.join("b")), filenames
+    )
+
+
+def test_run_benchmarks_against_baseline(tmpdir):
+    results_filepath = str(tmpdir.join("results.json"))
+    args = ["--files-count", "5", "--repeat", "1", "--hooks", "forbid_tabs,chmod"]
+    assert run_benchmarks(args + ["--json", results_filepath]) == 0
+    assert (
+        run_benchmarks(
+            args + ["--baseline", results_filepath, "--max-slowdown", "1000"]
+        )
+        == 0
+    )
+    # Results measured on another synthetic tree can not be compared:
+    other_args = ["--files-count", "6", "--repeat", "1", "--hooks", "chmod"]
+    assert run_benchmarks(other_args + ["--baseline", results_filepath]) == 2
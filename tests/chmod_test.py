@@ -1,7 +1,12 @@
+import os
 import sys
-from pre_commit_hooks.chmod import main as chmod
 
-from .utils import chdir_to_test_resources, capture_stdout
+import pytest
+
+from pre_commit_hooks.chmod import main as chmod, compile_mode
+from pre_commit_hooks import chmod as chmod_module
+
+from .utils import chdir_to_test_resources, capture_stdout, run_git
 
 
 def test_chmod_ok():
@@ -20,3 +25,203 @@ def test_chmod_ok():
 
 def test_invalid_perms():
     assert chmod(["668", __file__]) == 2
+
+
+def _create_files(tmpdir, mode):
+    paths = []
+    for relpath in ("a.txt", "sub/b.txt", "sub/c.txt", "sub/deeper/d.txt", "e.txt"):
+        path = tmpdir.join(relpath)
+        path.write("", ensure=True)
+        os.chmod(path.strpath, mode)
+        paths.append(path.strpath)
+    return paths
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="chmod does nothing on Windows")
+@pytest.mark.parametrize("dir_fd_supported", (True, False))
+def test_chmod_in_several_directories(dir_fd_supported, tmpdir, monkeypatch):
+    monkeypatch.setattr(chmod_module, "DIR_FD_SUPPORTED", dir_fd_supported)
+    paths = _create_files(tmpdir, 0o644)
+    os.chmod(paths[2], 0o600)
+    with capture_stdout() as stdout:
+        assert chmod(["600"] + paths) == 1
+    # Files are processed directory by directory, but reported in the order provided:
+    assert [line.split(":")[0] for line in stdout.getvalue().splitlines()] == [
+        f"Fixing file permissions on {path}"
+        for path in (paths[0], paths[1], paths[3], paths[4])
+    ]
+    for path in paths:
+        assert os.stat(path).st_mode & 0o777 == 0o600
+    assert chmod(["600"] + paths) == 0
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="chmod does nothing on Windows")
+def test_chmod_relative_paths(tmpdir, monkeypatch):
+    paths = _create_files(tmpdir, 0o644)
+    monkeypatch.chdir(tmpdir.strpath)
+    relpaths = [os.path.relpath(path) for path in paths]
+    assert chmod(["640"] + relpaths) == 1
+    for path in paths:
+        assert os.stat(path).st_mode & 0o777 == 0o640
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="chmod does nothing on Windows")
+def test_chmod_follows_symlinks(tmpdir):
+    target = tmpdir.join("target.txt")
+    target.write("")
+    os.chmod(target.strpath, 0o644)
+    link = tmpdir.join("sub", "link.txt")
+    link.dirpath().ensure(dir=True)
+    link.mksymlinkto(target)
+    assert chmod(["600", link.strpath]) == 1
+    assert os.stat(target.strpath).st_mode & 0o777 == 0o600
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="chmod does nothing on Windows")
+def test_chmod_missing_file(tmpdir):
+    with pytest.raises(FileNotFoundError):
+        chmod(["600", tmpdir.join("missing.txt").strpath])
+
+
+@pytest.mark.parametrize(
+    ("perms", "current_mode", "expected_mode"),
+    (
+        ("755", 0o4644, 0o755),
+        ("+x", 0o644, 0o755),
+        ("a+x", 0o600, 0o711),
+        ("u+x", 0o644, 0o744),
+        ("go-w", 0o666, 0o644),
+        ("u=rw,go=r", 0o777, 0o644),
+        ("u=rwx,g=rx,o=", 0o4666, 0o750),
+        ("o=", 0o1777, 0o770),
+        ("u+s,g+s", 0o755, 0o6755),
+        ("o+s", 0o755, 0o755),
+        ("+t", 0o777, 0o1777),
+        ("u-x+r", 0o300, 0o600),
+        ("g=w-w+r", 0o070, 0o040),
+        ("ug+rw,o-rwx", 0o007, 0o660),
+        ("=", 0o7777, 0o0),
+        ("+", 0o640, 0o640),
+    ),
+)
+def test_compile_mode(perms, current_mode, expected_mode):
+    mode_transform = compile_mode(perms)
+    new_mode = (current_mode & mode_transform.and_mask) | mode_transform.or_mask
+    assert new_mode == expected_mode
+
+
+@pytest.mark.parametrize("perms", ("668", "+z", "u+x,", "uo", "g=u", "a+X", "-9"))
+def test_invalid_symbolic_perms(perms):
+    assert chmod([perms, __file__]) == 2
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="chmod does nothing on Windows")
+def test_symbolic_mode(tmpdir, monkeypatch):
+    paths = _create_files(tmpdir, 0o644)
+    os.chmod(paths[1], 0o600)
+    os.chmod(paths[2], 0o755)  # nosec B103
+    with capture_stdout() as stdout:
+        assert chmod(["u+x,go-w"] + paths) == 1
+    assert f"Fixing file permissions on {paths[1]}: 0o600 -> 0o700" in stdout.getvalue()
+    assert paths[2] not in stdout.getvalue()
+    assert [os.stat(path).st_mode & 0o777 for path in paths] == [
+        0o744,
+        0o700,
+        0o755,
+        0o744,
+        0o744,
+    ]
+
+    def fail(*_, **__):
+        raise AssertionError("Files already in the target state should be skipped")
+
+    monkeypatch.setattr(os, "chmod", fail)
+    assert chmod(["u+x,go-w"] + paths) == 0
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="chmod does nothing on Windows")
+@pytest.mark.parametrize(
+    ("perms", "expected_mode"), (("-x", 0o644), ("-w", 0o555), ("-wx,u+w", 0o644))
+)
+def test_symbolic_mode_starting_with_dash(perms, expected_mode, tmpdir):
+    paths = _create_files(tmpdir, 0o755)
+    assert chmod([perms] + paths) == 1
+    assert chmod(["--", perms] + paths) == 0
+    assert [os.stat(path).st_mode & 0o777 for path in paths] == [expected_mode] * len(
+        paths
+    )
+
+
+def test_unknown_option_with_symbolic_mode(capsys):
+    with pytest.raises(SystemExit):
+        chmod(["-x", "--unknown-option", __file__])
+    assert "unrecognized arguments: -x --unknown-option" in capsys.readouterr().err
+
+
+@pytest.fixture(name="git_repo")
+def fixture_git_repo(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir.strpath)
+    run_git("init", "--quiet")
+    run_git("config", "core.fileMode", "true")
+    for relpath in ("script.sh", "sub/module.py", "sub/tool[1].sh", "untracked.txt"):
+        tmpdir.join(relpath).write("", ensure=True)
+        os.chmod(relpath, 0o644)
+    run_git("add", "script.sh", "sub")
+    run_git("update-index", "--chmod=+x", "--", "sub/tool[1].sh")
+    return tmpdir
+
+
+def _staged_modes():
+    return {
+        line.split("\t")[1]: line.split(" ")[0]
+        for line in run_git("ls-files", "--stage", "--full-name", ":/").splitlines()
+    }
+
+
+def test_chmod_git_index(git_repo, monkeypatch):
+    def fail(*_, **__):
+        raise AssertionError("The worktree should not be accessed")
+
+    run_git("config", "core.fileMode", "false")
+    with monkeypatch.context() as patch, capture_stdout() as stdout:
+        patch.setattr(os, "stat", fail)
+        patch.setattr(os, "chmod", fail)
+        assert (
+            chmod(
+                ["--git-index", "u+x", "script.sh", "./sub/tool[1].sh", "untracked.txt"]
+            )
+            == 0
+        )
+    assert (
+        stdout.getvalue() == "Fixing staged file mode of script.sh: 100644 -> 100755\n"
+    )
+    assert _staged_modes() == {
+        "script.sh": "100755",
+        "sub/module.py": "100644",
+        "sub/tool[1].sh": "100755",
+    }
+    assert os.stat(git_repo.join("script.sh").strpath).st_mode & 0o777 == 0o644
+
+
+def test_chmod_git_index_keeps_worktree_in_sync(git_repo):
+    # Like pre-commit, checks that the hook does not change the unstaged changes:
+    run_git("add", "sub/tool[1].sh")
+    assert run_git("diff") == ""
+    assert chmod(["--git-index", "u+x", "script.sh", "sub/module.py"]) == 0
+    assert _staged_modes()["script.sh"] == _staged_modes()["sub/module.py"] == "100755"
+    assert os.stat(git_repo.join("script.sh").strpath).st_mode & 0o777 == 0o744
+    assert run_git("diff") == ""
+    assert chmod(["--git-index", "-x", "sub/module.py"]) == 0
+    assert _staged_modes()["sub/module.py"] == "100644"
+    assert run_git("diff") == ""
+
+
+def test_chmod_git_index_from_subdirectory(git_repo, monkeypatch):
+    monkeypatch.chdir(git_repo.join("sub").strpath)
+    assert chmod(["--git-index", "644", "module.py", "tool[1].sh"]) == 0
+    assert chmod(["--git-index", "a-w", "module.py", "tool[1].sh"]) == 0
+    assert _staged_modes() == {
+        "script.sh": "100644",
+        "sub/module.py": "100644",
+        "sub/tool[1].sh": "100644",
+    }
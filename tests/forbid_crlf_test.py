@@ -0,0 +1,44 @@
+from pathlib import Path
+
+import pytest
+
+from pre_commit_hooks.forbid_crlf import main as forbid_crlf, chunks_contain_crlf
+from pre_commit_hooks import forbid_crlf as forbid_crlf_module
+
+
+@pytest.mark.parametrize(
+    ("input_s", "expected"),
+    (
+        (b"foo\r\nbar", 1),
+        (b"bar\nbaz\r\n", 1),
+        (b"foo\nbar\rbaz\n", 0),
+        (b"", 0),
+    ),
+)
+def test_forbid_crlf(input_s, expected, tmpdir):
+    input_file = Path(tmpdir.join("file.txt"))
+    input_file.write_bytes(input_s)
+    assert forbid_crlf([str(input_file)]) == expected
+
+
+@pytest.mark.parametrize(
+    ("chunks", "expected"),
+    (
+        ((b"foo\r", b"\nbar"), True),
+        ((b"foo\r", b"bar\n"), False),
+        ((b"foo\r", b"", b"\nbar"), True),
+        ((b"\r", b"\r", b"\n"), True),
+        ((b"foo", b"\r\n"), True),
+    ),
+)
+def test_chunks_contain_crlf(chunks, expected):
+    assert chunks_contain_crlf(chunks) == expected
+
+
+def test_crlf_at_chunk_boundary(tmpdir, monkeypatch):
+    monkeypatch.setattr(forbid_crlf_module, "CHUNK_SIZE", 4)
+    input_file = Path(tmpdir.join("file.txt"))
+    input_file.write_bytes(b"foo\r\nbar\n")
+    assert forbid_crlf([str(input_file)]) == 1
+    input_file.write_bytes(b"foo\rbar\n")
+    assert forbid_crlf([str(input_file)]) == 0
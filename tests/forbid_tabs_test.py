@@ -0,0 +1,31 @@
+import os
+from pathlib import Path
+import sys
+
+import pytest
+
+from pre_commit_hooks.forbid_tabs import main as forbid_tabs, contains_tabs
+
+
+@pytest.mark.parametrize(
+    ("input_s", "expected"),
+    (
+        (b"\tfoo", 1),
+        (b"foo\n" * 100000 + b"\tbar", 1),
+        (b"foo  bar\n", 0),
+        (b"", 0),
+    ),
+)
+def test_forbid_tabs(input_s, expected, tmpdir):
+    input_file = Path(tmpdir.join("file.txt"))
+    input_file.write_bytes(input_s)
+    assert forbid_tabs([str(input_file)]) == expected
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="requires a special file")
+def test_special_file_is_read_by_chunks():
+    assert not contains_tabs(os.devnull)
+
+
+def test_nothing_to_fix():
+    assert forbid_tabs([__file__]) == 0
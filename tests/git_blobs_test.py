@@ -0,0 +1,98 @@
+import os
+
+import pytest
+
+from pre_commit_hooks.git_blobs import (
+    INDEX_REV,
+    changed_blobs,
+    changed_paths,
+    list_paths,
+    read_blobs,
+    read_objects,
+)
+
+from .utils import run_git
+
+
+@pytest.fixture(name="git_repo")
+def fixture_git_repo(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir.strpath)
+    run_git("init", "--quiet")
+    tmpdir.join("a.txt").write_binary(b"committed\r\n")
+    tmpdir.join("sub", "b c.py").write_binary(b"\tcommitted\n", ensure=True)
+    run_git("add", ".")
+    run_git("commit", "--quiet", "-m", "initial")
+    tmpdir.join("a.txt").write_binary(b"staged\n")
+    run_git("add", "a.txt")
+    tmpdir.join("a.txt").write_binary(b"in worktree\n")
+    return tmpdir
+
+
+def test_read_blobs(git_repo):  # pylint: disable=unused-argument
+    assert list(read_blobs(["a.txt", "sub/b c.py", "missing.txt"], "HEAD")) == [
+        ("a.txt", b"committed\r\n"),
+        ("sub/b c.py", b"\tcommitted\n"),
+        ("missing.txt", None),
+    ]
+    assert list(read_blobs(["a.txt"], INDEX_REV)) == [("a.txt", b"staged\n")]
+
+
+def test_paths_are_relative_to_current_directory(git_repo, monkeypatch):
+    monkeypatch.chdir(git_repo.join("sub").strpath)
+    assert list_paths("HEAD") == list_paths(INDEX_REV) == ["b c.py"]
+    assert list(read_blobs(["b c.py", "../a.txt"], "HEAD")) == [
+        ("b c.py", b"\tcommitted\n"),
+        ("../a.txt", b"committed\r\n"),
+    ]
+
+
+def test_read_large_blobs(git_repo):
+    paths = [f"large_{i}.txt" for i in range(20)]
+    for i, path in enumerate(paths):
+        git_repo.join(path).write_binary(bytes([65 + i]) * 300000)
+    run_git("add", *paths)
+    blobs = read_blobs(list_paths(INDEX_REV), INDEX_REV)
+    assert [(path, len(content)) for path, content in blobs] == [
+        ("a.txt", 7),
+        *((path, 300000) for path in sorted(paths)),
+        ("sub/b c.py", 11),
+    ]
+    # Interrupting the iteration must not leave git blocked on a full pipe:
+    for _, content in read_blobs(paths, INDEX_REV):
+        assert content == b"A" * 300000
+        break
+
+
+def test_paths_with_end_lines_are_rejected(git_repo):  # pylint: disable=unused-argument
+    with pytest.raises(ValueError):
+        list(read_blobs(["a\nb.txt"], "HEAD"))
+
+
+def test_changed_paths(git_repo, monkeypatch):
+    git_repo.join("sub", "b c.py").write_binary(b"modified\n")
+    git_repo.join("untracked.txt").write_binary(b"untracked\n")
+    assert sorted(changed_paths("HEAD")) == ["a.txt", os.path.join("sub", "b c.py")]
+    monkeypatch.chdir(git_repo.join("sub").strpath)
+    assert changed_paths("HEAD") == ["b c.py"]
+
+
+def test_changed_blobs(git_repo, monkeypatch):
+    git_repo.join("c.txt").write_binary(b"c\n")
+    git_repo.join("sub", "b c.py").write_binary(b"modified\n")
+    run_git("add", ".")
+    run_git("commit", "--quiet", "-m", "second")
+    # Same content as a.txt in the previous commit:
+    git_repo.join("d.txt").write_binary(b"in worktree\n")
+    run_git("rm", "--quiet", "c.txt")
+    run_git("add", "d.txt")
+    run_git("commit", "--quiet", "-m", "third")
+    blobs = changed_blobs("HEAD~2..HEAD")
+    assert list(read_objects(blobs)) == [
+        ("d.txt", b"in worktree\n"),
+        ("c.txt", b"c\n"),
+        ("sub/b c.py", b"modified\n"),
+    ]
+    assert changed_blobs("HEAD~2..HEAD", ["sub"]) == blobs[2:]
+    assert not changed_blobs("HEAD~1..HEAD", ["c.txt"])
+    monkeypatch.chdir(git_repo.join("sub").strpath)
+    assert [path for path, _ in changed_blobs("HEAD~2..HEAD")] == ["b c.py"]
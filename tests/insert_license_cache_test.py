@@ -0,0 +1,106 @@
+import json
+import os
+import shutil
+
+import pytest
+
+from pre_commit_hooks.insert_license import main as insert_license, LicenseIndex
+from pre_commit_hooks.multi_check import main as multi_check
+
+from .utils import chdir_to_test_resources
+
+
+def _copy_sources(tmpdir, *src_file_paths):
+    paths = []
+    for i, src_file_path in enumerate(src_file_paths):
+        path = tmpdir.join(f"{i}_{src_file_path}")
+        shutil.copy(src_file_path, path.strpath)
+        paths.append(path.strpath)
+    return paths
+
+
+def _cache_files(cache_dir):
+    return sorted(os.listdir(cache_dir))
+
+
+@pytest.mark.parametrize("jobs", ("1", "2"))
+def test_warm_run_skips_matching(jobs, tmpdir, monkeypatch):
+    cache_dir = tmpdir.join("cache").strpath
+    with chdir_to_test_resources():
+        paths = _copy_sources(
+            tmpdir,
+            "module_without_license.py",
+            "module_with_license.py",
+            "module_with_license_todo.py",
+            "module_without_license_skip.py",
+        )
+        args = [
+            "--license-filepath",
+            "LICENSE_with_trailing_newline.txt",
+            "--cache-dir",
+            cache_dir,
+            "--jobs",
+            jobs,
+        ]
+        assert insert_license(args + paths) == 1
+        (cache_file,) = _cache_files(cache_dir)
+        with open(os.path.join(cache_dir, cache_file), encoding="utf8") as cache:
+            assert sorted(json.load(cache).values()) == ["present", "skip", "todo"]
+
+        # The license inserted during the previous run was not cached yet:
+        assert insert_license(args + paths[:1]) == 0
+
+        def fail(*_):
+            raise AssertionError("License matching should have been skipped")
+
+        monkeypatch.setattr(LicenseIndex, "find_in_raw_lines", fail)
+        assert insert_license(args + paths) == 1  # because of the TODO
+
+
+def test_cache_invalidation(tmpdir):
+    cache_dir = tmpdir.join("cache").strpath
+    with chdir_to_test_resources():
+        paths = _copy_sources(tmpdir, "module_with_license.py")
+
+        def run(license_file_path, *extra_args):
+            args = ["--license-filepath", license_file_path, "--cache-dir", cache_dir]
+            return insert_license(args + list(extra_args) + paths)
+
+        assert run("LICENSE_with_trailing_newline.txt") == 0
+        assert len(_cache_files(cache_dir)) == 1
+        assert run("LICENSE_without_trailing_newline.txt") == 0
+        assert len(_cache_files(cache_dir)) == 2
+        # The file is modified, so no verdict gets cached:
+        assert run("LICENSE_with_trailing_newline.txt", "--comment-style", "//") == 1
+        assert len(_cache_files(cache_dir)) == 2
+
+
+def test_cache_shared_by_multi_check_runs_selecting_other_checks(tmpdir):
+    cache_dir = tmpdir.join("cache").strpath
+    with chdir_to_test_resources():
+        paths = _copy_sources(tmpdir, "module_with_license.py")
+        args = ["--license-filepath", "LICENSE_with_trailing_newline.txt"]
+        assert insert_license(args + ["--cache-dir", cache_dir] + paths) == 0
+        for checks in (["--license"], ["--license", "--crlf"], ["--tabs", "--license"]):
+            assert multi_check(checks + args + ["--cache-dir", cache_dir] + paths) == 0
+    assert len(_cache_files(cache_dir)) == 1
+
+
+def test_cache_eviction(tmpdir):
+    cache_dir = tmpdir.join("cache").strpath
+    with chdir_to_test_resources():
+        paths = _copy_sources(
+            tmpdir, "module_with_license.py", "module_with_license_and_shebang.py"
+        )
+        args = [
+            "--license-filepath",
+            "LICENSE_with_trailing_newline.txt",
+            "--cache-dir",
+            cache_dir,
+            "--cache-max-entries",
+            "1",
+        ]
+        assert insert_license(args + paths) == 0
+        (cache_file,) = _cache_files(cache_dir)
+        with open(os.path.join(cache_dir, cache_file), encoding="utf8") as cache:
+            assert len(json.load(cache)) == 1
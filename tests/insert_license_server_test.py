@@ -0,0 +1,144 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+import shutil
+import threading
+import time
+
+import pytest
+
+from pre_commit_hooks import insert_license as insert_license_module
+from pre_commit_hooks.insert_license import main as insert_license
+from pre_commit_hooks.insert_license_server import LicenseCheckServer
+
+from .utils import chdir_to_test_resources
+
+LICENSE_ARGS = ["--license-filepath", "LICENSE_with_trailing_newline.txt"]
+
+
+@pytest.fixture(name="server")
+def fixture_server(tmpdir, monkeypatch):
+    socket_path = tmpdir.join("insert_license.sock").strpath
+    monkeypatch.setenv("INSERT_LICENSE_SOCKET", socket_path)
+    with LicenseCheckServer(socket_path) as server:
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            yield server
+        finally:
+            server.shutdown()
+            thread.join()
+
+
+@pytest.fixture(name="loaded_licenses")
+def fixture_loaded_licenses(monkeypatch):
+    loaded_licenses = []
+    get_license_info_list = insert_license_module.get_license_info_list
+
+    def counting_get_license_info_list(args):
+        loaded_licenses.append(args.license_filepath)
+        return get_license_info_list(args)
+
+    monkeypatch.setattr(
+        insert_license_module, "get_license_info_list", counting_get_license_info_list
+    )
+    return loaded_licenses
+
+
+def test_server_reuses_loaded_licenses(server, loaded_licenses, tmpdir, capsys):
+    with chdir_to_test_resources():
+        src_filepath = tmpdir.join("module_without_license.py").strpath
+        shutil.copy("module_without_license.py", src_filepath)
+        assert insert_license(LICENSE_ARGS + [src_filepath]) == 1
+        assert insert_license(LICENSE_ARGS + [src_filepath]) == 0
+        with open("module_with_license.py", encoding="utf8") as expected_file:
+            with open(src_filepath, encoding="utf8") as src_file:
+                assert src_file.read() == expected_file.read()
+    assert (
+        f"Some sources were modified by the hook ['{src_filepath}']"
+        in capsys.readouterr().out
+    )
+    assert len(loaded_licenses) == 1
+    assert len(server.license_info_lists) == 1
+
+
+def test_server_reloads_modified_licenses(server, loaded_licenses, tmpdir):
+    license_filepath = tmpdir.join("LICENSE.txt")
+    license_filepath.write("Copyright (C) 2017 Teela O'Malley\n")
+    src_filepath = tmpdir.join("module.py")
+    src_filepath.write("# Copyright (C) 2017 Teela O'Malley\n")
+    args = ["--license-filepath", license_filepath.strpath, src_filepath.strpath]
+    assert insert_license(args) == 0
+    license_filepath.write("Copyright (C) 2017 Teela O'Malley & Co\n")
+    assert insert_license(args) == 1
+    assert len(loaded_licenses) == 2
+    assert len(server.license_info_lists) == 2
+
+
+@pytest.mark.usefixtures("server")
+def test_server_processes_runs_in_parallel(tmpdir, monkeypatch):
+    def run_waiting_for_other_run(argv, _):
+        tmpdir.join(argv[0]).write("")
+        other_run_filepath = tmpdir.join("b" if argv[0] == "a" else "a")
+        deadline = time.monotonic() + 5
+        while not other_run_filepath.exists():
+            if time.monotonic() > deadline:
+                return 1
+            time.sleep(0.01)
+        return 0
+
+    # Patched in the server, and thus in the child processes it forks:
+    monkeypatch.setattr(insert_license_module, "run", run_waiting_for_other_run)
+    initial_cwd = os.getcwd()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        assert list(executor.map(insert_license, (["a"], ["b"]))) == [0, 0]
+    assert os.getcwd() == initial_cwd
+
+
+@pytest.mark.usefixtures("server")
+def test_server_reports_argparse_errors(capsys):
+    assert insert_license(["--unknown-option"]) == 2
+    assert "unrecognized arguments: --unknown-option" in capsys.readouterr().err
+
+
+@pytest.mark.usefixtures("server")
+def test_server_forwards_stats_env_var(monkeypatch, capsys):
+    monkeypatch.setenv("INSERT_LICENSE_STATS", "1")
+    with chdir_to_test_resources():
+        assert insert_license(LICENSE_ARGS + ["module_with_license.py"]) == 0
+    assert "insert-license stats: 1 files processed" in capsys.readouterr().err
+
+
+def test_server_runs_hook_with_client_environment(server, tmpdir, monkeypatch):
+    server_cache_dir = tmpdir.join("server_cache")
+    monkeypatch.setenv("XDG_CACHE_HOME", server_cache_dir.strpath)
+    with chdir_to_test_resources():
+        response = server.process(
+            {
+                "argv": LICENSE_ARGS + ["module_with_license.py", "--cache-dir"],
+                "cwd": os.getcwd(),
+                "env": {"HOME": tmpdir.strpath},
+                "version": server.version,
+            }
+        )
+    assert response["return_code"] == 0
+    assert tmpdir.join(".cache", "pre-commit-hooks").listdir()
+    assert not server_cache_dir.check()
+    assert os.environ["XDG_CACHE_HOME"] == server_cache_dir.strpath
+
+
+def test_server_ignored_when_running_another_version(server, loaded_licenses, capsys):
+    server.version = ["another", "version"]
+    with chdir_to_test_resources():
+        assert insert_license(LICENSE_ARGS + ["module_with_license.py"]) == 0
+    assert "Ignoring the insert-license server" in capsys.readouterr().err
+    assert len(loaded_licenses) == 1  # by the hook running in-process
+    assert not server.license_info_lists
+
+
+def test_fallback_when_no_server_listens(tmpdir, monkeypatch, loaded_licenses):
+    socket_path = tmpdir.join("insert_license.sock")
+    socket_path.write("")  # left by a server that did not exit cleanly
+    monkeypatch.setenv("INSERT_LICENSE_SOCKET", socket_path.strpath)
+    with chdir_to_test_resources():
+        assert insert_license(LICENSE_ARGS + ["module_with_license.py"]) == 0
+    assert len(loaded_licenses) == 1
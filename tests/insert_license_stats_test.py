@@ -0,0 +1,97 @@
+import json
+import shutil
+
+import pytest
+
+from pre_commit_hooks.insert_license import main as insert_license
+from pre_commit_hooks.insert_license_stats import Stats
+
+from .utils import chdir_to_test_resources
+
+
+def _copy_sources(tmpdir, *src_file_paths):
+    paths = []
+    for i, src_file_path in enumerate(src_file_paths):
+        path = tmpdir.join(f"{i}_{src_file_path}")
+        shutil.copy(src_file_path, path.strpath)
+        paths.append(path.strpath)
+    return paths
+
+
+@pytest.mark.parametrize("jobs", ("1", "2"))
+def test_stats_json(jobs, tmpdir):
+    stats_filepath = tmpdir.join("stats.json").strpath
+    with chdir_to_test_resources():
+        paths = _copy_sources(
+            tmpdir,
+            "module_without_license.py",
+            "module_with_license.py",
+            "module_with_license_todo.py",
+            "module_with_fuzzy_matched_license.py",
+        )
+        args = [
+            "--license-filepath",
+            "LICENSE_with_trailing_newline.txt",
+            "--fuzzy-match-generates-todo",
+            "--jobs",
+            jobs,
+            "--stats-json",
+            stats_filepath,
+        ]
+        assert insert_license(args + paths) == 1
+    with open(stats_filepath, encoding="utf8") as stats_file:
+        stats = json.load(stats_file)
+    assert list(stats["phases"]) == [
+        "read",
+        "comments_search",
+        "exact_match",
+        "decode",
+        "fuzzy_match",
+        "rewrite",
+    ]
+    assert stats["phases"]["read"]["calls"] == 4
+    assert stats["phases"]["rewrite"]["calls"] == 2
+    assert stats["counters"] == {"changed": 1, "files": 4, "todo": 2}
+    assert (
+        sorted(slow_file["filepath"] for slow_file in stats["slowest_files"]) == paths
+    )
+
+
+def test_stats_summary_enabled_by_env_var(tmpdir, monkeypatch, capsys):
+    monkeypatch.setenv("INSERT_LICENSE_STATS", "1")
+    with chdir_to_test_resources():
+        paths = _copy_sources(tmpdir, "module_with_license.py")
+        assert (
+            insert_license(
+                ["--license-filepath", "LICENSE_with_trailing_newline.txt"] + paths
+            )
+            == 0
+        )
+    summary = capsys.readouterr().err
+    assert "insert-license stats: 1 files processed" in summary
+    assert "exact_match" in summary
+    assert paths[0] in summary
+
+
+@pytest.mark.parametrize("value", ("", "0", "false", "No", "off"))
+def test_stats_disabled_by_env_var(value, monkeypatch, capsys):
+    monkeypatch.setenv("INSERT_LICENSE_STATS", value)
+    with chdir_to_test_resources():
+        args = ["--license-filepath", "LICENSE_with_trailing_newline.txt"]
+        assert insert_license(args + ["module_with_license.py"]) == 0
+    assert "insert-license stats" not in capsys.readouterr().err
+
+
+def test_slowest_files_are_kept_when_merging():
+    stats = Stats(slowest_files_count=2)
+    worker_stats = Stats()
+    for seconds, filepath in ((3, "c"), (1, "a"), (2, "b")):
+        worker_stats._add_file(seconds, filepath)  # pylint: disable=protected-access
+    worker_stats.count("files", 3)
+    stats.merge_updates(worker_stats.pop_updates())
+    assert not worker_stats.pop_updates()["counters"]
+    assert stats.as_dict()["slowest_files"] == [
+        {"filepath": "c", "seconds": 3},
+        {"filepath": "b", "seconds": 2},
+    ]
+    assert stats.as_dict()["counters"] == {"files": 3}
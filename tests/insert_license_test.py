@@ -1,15 +1,36 @@
 from datetime import datetime
+import itertools
 from itertools import chain, product
+import os
+import random
 import shutil
+import subprocess  # nosec B404
+import sys
+import time
 import pytest
+from rapidfuzz import fuzz
 
+from pre_commit_hooks import insert_license as insert_license_module
 from pre_commit_hooks.insert_license import main as insert_license, LicenseInfo
-from pre_commit_hooks.insert_license import find_license_header_index
+from pre_commit_hooks.insert_license import (
+    find_license_header_index,
+    _decode_lines,
+    _read_header_lines,
+    normalize_lines,
+    LicenseMatcher,
+    LicenseIndex,
+    _fuzzy_tokens,
+    _token_set_ratio_upper_bound,
+    FUZZY_MATCH_TODO_COMMENT,
+    FUZZY_MATCH_TODO_INSTRUCTIONS,
+)
+
+from .utils import chdir_to_test_resources, capture_stdout, run_git
 
-from .utils import chdir_to_test_resources, capture_stdout
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
 
 
-# pylint: disable=too-many-arguments
+# pylint: disable=too-many-arguments,too-many-lines
 
 
 def _convert_line_ending(file_path, new_line_endings):
@@ -977,3 +998,537 @@ def test_remove_license(
                 expected_content = expected_content_file.read()
             new_file_content = path.open(encoding="utf-8").read()
             assert new_file_content == expected_content
+
+
+def test_license_detection_only_decodes_header(tmpdir):
+    with chdir_to_test_resources():
+        with open("module_with_license.py", encoding="utf-8") as src_file:
+            input_contents = src_file.read()
+        path = tmpdir.join("src_file_path")
+        # The UTF-8 invalid byte lies well beyond the first buffered chunk:
+        input_bytes = (input_contents + "\n" * 100000).encode("utf-8") + b"\xe9\n"
+        path.write_binary(input_bytes)
+        header_lines = _read_header_lines(path.strpath, max_lines=10)
+        assert _decode_lines(path.strpath, header_lines)[1] == "utf8"
+        all_lines = _read_header_lines(path.strpath, max_lines=200000)
+        assert _decode_lines(path.strpath, all_lines)[1] == "ISO-8859-1"
+        args = ["--license-filepath", "LICENSE_with_trailing_newline.txt"]
+        assert insert_license(args + [path.strpath]) == 0
+        assert path.read_binary() == input_bytes
+
+
+@pytest.mark.parametrize("ascii_lines_count", (20, 100000))
+def test_non_ascii_license_inserted_with_encoding_of_lines_below_header(
+    ascii_lines_count, tmpdir
+):
+    license_path = tmpdir.join("LICENSE.txt")
+    license_path.write_binary("Copyright (C) Société\n".encode("utf8"))
+    path = tmpdir.join("main.cpp")
+    src_bytes = b"int x;\n" * ascii_lines_count + '"café";\n'.encode("ISO-8859-1")
+    path.write_binary(src_bytes)
+    args = ["--license-filepath", license_path.strpath, "--comment-style", "//"]
+    assert insert_license(args + [path.strpath]) == 1
+    assert path.read_binary() == (
+        "// Copyright (C) Société\n\n".encode("ISO-8859-1") + src_bytes
+    )
+    assert insert_license(args + [path.strpath]) == 0
+
+
+@pytest.mark.parametrize(
+    ("src_file_path", "extra_args"),
+    (
+        ("module_without_license.py", []),
+        ("module_with_license.py", ["--remove-header"]),
+        ("module_with_stale_year_in_license.py", ["--use-current-year"]),
+        ("module_with_fuzzy_matched_license.py", ["--fuzzy-match-generates-todo"]),
+    ),
+)
+def test_rewrites_copy_the_rest_of_the_file_as_is(src_file_path, extra_args, tmpdir):
+    # Not decodable in UTF-8, and large enough to be copied by several chunks:
+    tail = b"\xe9\xff\r\n" + b"x" * (3 * 1024 * 1024) + b"\n"
+    args = ["--license-filepath", "LICENSE_with_trailing_newline.txt"] + extra_args
+    with chdir_to_test_resources():
+        with open(src_file_path, "rb") as src_file:
+            input_bytes = src_file.read()
+        path, path_with_tail = tmpdir.join("src.py"), tmpdir.join("src_with_tail.py")
+        path.write_binary(input_bytes)
+        path_with_tail.write_binary(input_bytes + tail)
+        assert insert_license(args + [path.strpath]) == 1
+        assert insert_license(args + [path_with_tail.strpath]) == 1
+    assert path.read_binary() != input_bytes
+    assert path_with_tail.read_binary() == path.read_binary() + tail
+
+
+def test_insert_license_after_regex_beyond_top_lines(tmpdir):
+    path = tmpdir.join("src.php")
+    path.write_binary(b"<html>\n" * 100 + b"<?php\n$x = 1;\n")
+    args = [
+        "--license-filepath",
+        "LICENSE_with_trailing_newline.txt",
+        "--insert-license-after-regex",
+        "^<\\?php$",
+    ]
+    with chdir_to_test_resources():
+        assert insert_license(args + [path.strpath]) == 1
+        with open("LICENSE_with_trailing_newline.txt", "rb") as license_file:
+            license_lines = license_file.read().splitlines(keepends=True)
+    assert path.read_binary() == (
+        b"<html>\n" * 100
+        + b"<?php\n"
+        + b"".join(
+            b"# " + line if line.strip() else b"#" + line for line in license_lines
+        )
+        + b"\n$x = 1;\n"
+    )
+
+
+@pytest.mark.parametrize(
+    ("src_file_path", "comment_style"),
+    (
+        ("module_with_license.py", "#"),
+        ("main_iso8859_with_license.cpp", "/*|\t| */"),
+        ("module_without_license_skip.py", "#"),
+        ("module_with_license_todo.py", "#"),
+    ),
+)
+def test_unmodified_files_are_not_decoded(
+    src_file_path, comment_style, tmpdir, monkeypatch
+):
+    def fail(*_):
+        raise AssertionError("Source files should only be decoded before a rewrite")
+
+    monkeypatch.setattr(insert_license_module, "_decode_lines", fail)
+    with chdir_to_test_resources():
+        path = tmpdir.join(src_file_path)
+        shutil.copy(src_file_path, path.strpath)
+        args = [
+            "--license-filepath",
+            "LICENSE_with_trailing_newline.txt",
+            "--comment-style",
+            comment_style,
+        ]
+        insert_license(args + [path.strpath])
+        with open(src_file_path, "rb") as src_file:
+            assert path.read_binary() == src_file.read()
+
+
+@pytest.mark.parametrize("encoding", ("utf8", "ISO-8859-1"))
+def test_non_ascii_license_found_in_any_encoding(encoding, tmpdir):
+    license_path = tmpdir.join("LICENSE.txt")
+    license_path.write_binary("Copyright (C) 2017 Héloïse\n".encode("utf8"))
+    path = tmpdir.join("src.py")
+    src_bytes = "# Copyright (C) 2017 Héloïse\n\nimport sys\n".encode(encoding)
+    path.write_binary(src_bytes)
+    assert (
+        insert_license(["--license-filepath", license_path.strpath, path.strpath]) == 0
+    )
+    assert path.read_binary() == src_bytes
+
+
+@pytest.mark.parametrize("chunk_size", (1, 2, 3, 8192))
+@pytest.mark.parametrize("max_lines", (0, 1, 3, 10))
+def test_read_header_lines(chunk_size, max_lines, tmpdir, monkeypatch):
+    monkeypatch.setattr(insert_license_module, "HEADER_CHUNK_SIZE", chunk_size)
+    path = tmpdir.join("src.txt")
+    src_bytes = b"a\r\nb\rc\n\r\n\n\x0cd\xe9\r\nlast"
+    path.write_binary(src_bytes)
+    with open(path.strpath, encoding="ISO-8859-1", newline="") as src_file:
+        expected_lines = [
+            line.encode("ISO-8859-1") for line in itertools.islice(src_file, max_lines)
+        ]
+    assert _read_header_lines(path.strpath, max_lines) == expected_lines
+    assert _read_header_lines("", max_lines, src_file_bytes=src_bytes) == expected_lines
+
+
+LICENSE_WITH_EURO = "Copyright (C) 2017 Société €\n"
+PREFIXED_LICENSE_WITH_EURO = "# " + LICENSE_WITH_EURO + "\n"
+
+
+@pytest.mark.parametrize(
+    ("encodings", "src_encoding"),
+    (("utf8,cp1252", "utf8"), ("utf8,cp1252", "cp1252"), ("cp1252", "cp1252")),
+)
+def test_encodings(encodings, src_encoding, tmpdir):
+    license_path = tmpdir.join("LICENSE.txt")
+    license_path.write_binary(LICENSE_WITH_EURO.encode("utf8"))
+    args = ["--license-filepath", license_path.strpath, "--encodings", encodings]
+    path = tmpdir.join("src.py")
+    src_bytes = "café = 1\n".encode(src_encoding)
+    path.write_binary(src_bytes)
+    assert insert_license(args + [path.strpath]) == 1
+    assert (
+        path.read_binary()
+        == PREFIXED_LICENSE_WITH_EURO.encode(src_encoding) + src_bytes
+    )
+    assert insert_license(args + [path.strpath]) == 0
+
+
+@pytest.mark.parametrize("encodings", ("utf16", "utf8,utf-32-le", "unknown", ","))
+def test_invalid_encodings(encodings):
+    with pytest.raises(SystemExit):
+        insert_license(["--encodings", encodings, "src.py"])
+
+
+@pytest.mark.parametrize(
+    ("extra_args", "src_bytes", "expected_bytes"),
+    (
+        (
+            [],
+            b"import sys\n",
+            PREFIXED_LICENSE_WITH_EURO.encode("utf8") + b"import sys\n",
+        ),
+        ([], PREFIXED_LICENSE_WITH_EURO.encode("utf8") + b"import sys\n", None),
+        (
+            ["--remove-header"],
+            PREFIXED_LICENSE_WITH_EURO.encode("utf8") + b"import sys\n",
+            b"import sys\n",
+        ),
+        (
+            ["--fuzzy-match-generates-todo"],
+            b"# Copyright (C) 2017 Societe\n\nimport sys\n",
+            b"#"
+            + FUZZY_MATCH_TODO_COMMENT.encode("utf8")
+            + b"\n#"
+            + FUZZY_MATCH_TODO_INSTRUCTIONS.encode("utf8")
+            + b"\n# Copyright (C) 2017 Societe\n\nimport sys\n",
+        ),
+    ),
+)
+def test_utf8_byte_order_mark_stays_first(
+    extra_args, src_bytes, expected_bytes, tmpdir
+):
+    license_path = tmpdir.join("LICENSE.txt")
+    license_path.write_binary(LICENSE_WITH_EURO.encode("utf8"))
+    args = ["--license-filepath", license_path.strpath, "--encodings", "cp1252"]
+    path = tmpdir.join("src.py")
+    path.write_binary(b"\xef\xbb\xbf" + src_bytes)
+    assert insert_license(args + extra_args + [path.strpath]) == (
+        0 if expected_bytes is None else 1
+    )
+    assert path.read_binary() == b"\xef\xbb\xbf" + (expected_bytes or src_bytes)
+
+
+def test_utf16_is_not_supported(tmpdir):
+    path = tmpdir.join("src.py")
+    path.write_binary("import sys\n".encode("utf16"))
+    with chdir_to_test_resources():
+        with capture_stdout() as stdout, pytest.raises(UnicodeError):
+            insert_license(
+                [
+                    "--license-filepath",
+                    "LICENSE_with_trailing_newline.txt",
+                    path.strpath,
+                ]
+            )
+    assert "file encoding is probably not supported" in stdout.getvalue()
+
+
+@pytest.mark.parametrize("jobs", ("1", "2"))
+def test_insert_license_in_parallel(jobs, tmpdir):
+    src_files = (
+        "module_without_license.py",
+        "module_with_license.py",
+        "module_with_license_todo.py",
+        "module_with_stale_year_range_in_license.py",
+        "module_without_license_skip.py",
+    ) * 2
+    with chdir_to_test_resources():
+        paths = []
+        for i, src_file_path in enumerate(src_files):
+            path = tmpdir.join(f"{i}_{src_file_path}")
+            shutil.copy(src_file_path, path.strpath)
+            paths.append(path.strpath)
+        args = [
+            "--license-filepath",
+            "LICENSE_with_trailing_newline.txt",
+            "--use-current-year",
+            "--jobs",
+            jobs,
+        ]
+        with capture_stdout() as stdout:
+            assert insert_license(args + paths) == 1
+        changed = [path for i, path in enumerate(paths) if i % 5 in (0, 1, 3)]
+        todo = [path for i, path in enumerate(paths) if i % 5 == 2]
+        assert f"Some sources were modified by the hook {changed}" in stdout.getvalue()
+        assert (
+            f"Some sources contain TODO about inconsistent licenses: {todo}"
+            in stdout.getvalue()
+        )
+
+
+@pytest.mark.parametrize(
+    ("src_file_path", "fail_check"),
+    (
+        ("module_without_license.py", True),
+        ("module_with_license.py", False),
+        ("module_with_stale_year_range_in_license.py", False),
+        ("module_with_license_todo.py", True),
+        ("module_without_license_skip.py", False),
+    ),
+)
+def test_check_only(src_file_path, fail_check, tmpdir):
+    with chdir_to_test_resources():
+        path = tmpdir.join(src_file_path)
+        shutil.copy(src_file_path, path.strpath)
+        args = [
+            "--license-filepath",
+            "LICENSE_with_trailing_newline.txt",
+            "--use-current-year",
+            "--check-only",
+            path.strpath,
+        ]
+        with capture_stdout() as stdout:
+            assert insert_license(args) == int(fail_check)
+        with open(src_file_path, "rb") as src_file:
+            assert path.read_binary() == src_file.read()
+    assert (f"License header not found in: {path.strpath}" in stdout.getvalue()) == (
+        src_file_path == "module_without_license.py"
+    )
+
+
+def test_years_updated_only_in_files_changed_since_git_ref(tmpdir, monkeypatch):
+    with chdir_to_test_resources():
+        for path in ("unchanged.py", "changed.py", "sub/changed_in_index.py"):
+            tmpdir.join(path).ensure()
+            shutil.copy("module_with_stale_year_in_license.py", tmpdir.join(path))
+        shutil.copy("LICENSE_with_trailing_newline.txt", tmpdir.join("LICENSE.txt"))
+        with open("module_with_year_range_in_license.py", "rb") as expected_file:
+            updated_content = expected_file.read().replace(
+                b"2017", str(datetime.now().year).encode()
+            )
+    monkeypatch.chdir(tmpdir.strpath)
+    run_git("init", "--quiet")
+    run_git("add", ".")
+    run_git("commit", "--quiet", "-m", "initial")
+    initial_content = tmpdir.join("unchanged.py").read_binary()
+    tmpdir.join("changed.py").write_binary(initial_content + b"print(sys.argv)\n")
+    tmpdir.join("sub", "changed_in_index.py").write_binary(initial_content + b"\n")
+    run_git("add", "sub")
+    args = [
+        "--use-current-year",
+        "--cache-dir",
+        tmpdir.join("cache").strpath,
+        "unchanged.py",
+        "changed.py",
+        "./sub/changed_in_index.py",
+    ]
+    with capture_stdout() as stdout:
+        assert insert_license(["--changed-since", "HEAD"] + args) == 1
+    assert (
+        "Some sources were modified by the hook ['changed.py', './sub/changed_in_index.py']"
+        in stdout.getvalue()
+    )
+    assert tmpdir.join("unchanged.py").read_binary() == initial_content
+    assert tmpdir.join("changed.py").read_binary().startswith(updated_content)
+    assert (
+        tmpdir.join("sub", "changed_in_index.py")
+        .read_binary()
+        .startswith(updated_content)
+    )
+    # The verdict cached on the unchanged file does not prevent updating it afterwards:
+    with capture_stdout():
+        assert insert_license(["--changed-since", "HEAD"] + args) == 0
+        assert insert_license(args) == 1
+    assert tmpdir.join("unchanged.py").read_binary() == updated_content
+
+
+@pytest.mark.parametrize(
+    ("src_file_content", "expected_index", "match_years_strictly"),
+    (
+        (
+            ["# License line 1\n", "\n", "# License line 1\n", "# Copyright 2017\n"],
+            2,
+            True,
+        ),
+        (
+            ["# License line 1\n", "# License line 1\n", "# Copyright 1984\n"],
+            None,
+            True,
+        ),
+        (["# License line 1\n", "# License line 1\n", "# Copyright 1984\n"], 1, False),
+        (
+            ["\n", "\n", "\n", "\n", "# License line 1\n", "# Copyright 2017\n"],
+            None,
+            True,
+        ),
+        (["# License line 1\n"], None, True),
+    ),
+)
+def test_license_matcher(src_file_content, expected_index, match_years_strictly):
+    matcher = LicenseMatcher(["# License line 1\n", "# Copyright 2017\n"])
+    normalized_src_lines = normalize_lines(src_file_content, match_years_strictly)
+    assert expected_index == matcher.find(
+        normalized_src_lines, 4, match_years_strictly=match_years_strictly
+    )
+
+
+@pytest.mark.parametrize(
+    ("src_file_content", "expected_license", "expected_index"),
+    (
+        (["# License B\n", "# License A\n", "\n"], "A", 1),
+        (["# License B\n", "\n"], "B", 0),
+        (["# License C\n", "# line 2\n", "\n"], "C", 0),
+        (["# License C\n", "# other line 2\n", "# License B\n"], "B", 2),
+        (["# License D\n", "\n"], None, None),
+    ),
+)
+def test_license_index(src_file_content, expected_license, expected_index):
+    license_info_list = [
+        LicenseInfo(
+            plain_license="",
+            eol="\n",
+            comment_start="",
+            comment_prefix="#",
+            comment_end="",
+            num_extra_lines=0,
+            prefixed_license=prefixed_license,
+        )
+        for prefixed_license in (
+            ["# License A\n"],
+            ["# License B\n"],
+            ["# License C\n", "# line 2\n"],
+        )
+    ]
+    license_info, index = LicenseIndex(license_info_list).find_in_raw_lines(
+        [line.encode() for line in src_file_content],
+        5,
+        match_years_strictly=True,
+    )
+    assert index == expected_index
+    if expected_license is None:
+        assert license_info is None
+    else:
+        assert license_info is not None
+        assert license_info.prefixed_license[0] == f"# License {expected_license}\n"
+
+
+@pytest.mark.parametrize(
+    "src_file_bytes",
+    (
+        b"# Copyright (C) 2017 Acme\xc2\xa0\n",
+        b"# Copyright (C) 2017 Acme\xa0\n",
+        b"\xe2\x80\x83# Copyright (C) 2017 Acme\n",
+        b"# Copyright (C) 2017 Acme\xc2\x85\n",
+        b"# Copyright (C) 2017 Acme\x1c\n",
+    ),
+)
+@pytest.mark.parametrize("extra_args", ([], ["--allow-past-years"]))
+def test_license_with_non_ascii_whitespaces(src_file_bytes, extra_args, tmpdir):
+    license_path = tmpdir.join("LICENSE.txt")
+    license_path.write_binary(b"Copyright (C) 2017 Acme\n")
+    path = tmpdir.join("module.py")
+    path.write_binary(src_file_bytes)
+    args = ["--license-filepath", license_path.strpath, *extra_args, path.strpath]
+    assert insert_license(args) == 0
+    assert path.read_binary() == src_file_bytes
+
+
+def test_token_set_ratio_upper_bound():
+    rand = random.Random(42)  # nosec B311
+    vocabulary = (
+        "Copyright",
+        "(C)",
+        "2017",
+        "Teela",
+        "O'Malley",
+        "license",
+        "MIT",
+        "a",
+        "b",
+        "foo",
+        "",
+        # rapidfuzz only splits on those spaces in strings having non Latin-1 characters:
+        "droits\xa0:",
+        "\xa0",
+        "a\x85b",
+        "\u0150",
+    )
+    for _ in range(2000):
+        string_a = " ".join(rand.choices(vocabulary, k=rand.randint(0, 8)))
+        string_b = " ".join(rand.choices(vocabulary, k=rand.randint(0, 8)))
+        upper_bound = _token_set_ratio_upper_bound(
+            _fuzzy_tokens(string_a), _fuzzy_tokens(string_b)
+        )
+        assert upper_bound >= fuzz.token_set_ratio(string_a, string_b) - 1e-9
+
+
+def test_fuzzy_match_license_with_non_breaking_spaces(tmpdir):
+    license_path = tmpdir.join("LICENSE.txt")
+    license_path.write_text("droits\xa0: tous droits tous Corp.\n", encoding="utf8")
+    src_path = tmpdir.join("module.py")
+    src_path.write_text(
+        "# droits\xa0: License droits tous Acme\nx = 1\n", encoding="utf8"
+    )
+    args = ["--license-filepath", license_path.strpath, "--fuzzy-match-generates-todo"]
+    assert insert_license(args + [src_path.strpath]) == 1
+    assert FUZZY_MATCH_TODO_COMMENT in src_path.read_text(encoding="utf8")
+
+
+def test_fuzzy_match_license_after_long_preamble(tmpdir):
+    with chdir_to_test_resources():
+        preamble = "x = 1\n" * 40
+        paths = [tmpdir.join("src_file_path"), tmpdir.join("src_with_preamble")]
+        shutil.copy("module_with_fuzzy_matched_license.py", paths[0].strpath)
+        paths[1].write(preamble + paths[0].read())
+        args = [
+            "--license-filepath",
+            "LICENSE_with_trailing_newline.txt",
+            "--fuzzy-match-generates-todo",
+            "--detect-license-in-X-top-lines=50",
+        ]
+        assert insert_license(args + [path.strpath for path in paths]) == 1
+        assert FUZZY_MATCH_TODO_COMMENT in paths[0].read()
+        assert paths[1].read() == preamble + paths[0].read()
+
+
+# Maximum time spent by the hook on top of the Python interpreter startup:
+STARTUP_BUDGET_IN_SECONDS = 0.5
+
+
+def _min_run_duration(*args):
+    env = dict(os.environ, PYTHONPATH=ROOT_DIR)
+    durations = []
+    for _ in range(3):
+        start = time.perf_counter()
+        subprocess.run(  # nosec B603
+            [sys.executable, *args], check=True, env=env, capture_output=True
+        )
+        durations.append(time.perf_counter() - start)
+    return min(durations)
+
+
+@pytest.mark.parametrize(
+    "args",
+    (
+        ("--help",),
+        (
+            "--license-filepath",
+            "LICENSE_with_trailing_newline.txt",
+            "module_with_license.py",
+        ),
+    ),
+)
+def test_startup_time(args):
+    with chdir_to_test_resources():
+        interpreter_startup = _min_run_duration("-c", "pass")
+        hook_run = _min_run_duration("-m", "pre_commit_hooks.insert_license", *args)
+    assert hook_run - interpreter_startup < STARTUP_BUDGET_IN_SECONDS
+
+
+def test_optional_modules_not_imported_when_unused():
+    with chdir_to_test_resources():
+        script = (
+            "import sys\n"
+            "from pre_commit_hooks.insert_license import main\n"
+            "assert main(['--license-filepath', 'LICENSE_with_trailing_newline.txt', 'module_with_license.py']) == 0\n"
+            "print(sorted({'datetime', 'rapidfuzz', 'hashlib', 'concurrent.futures', 'tempfile',"
+            " 'pre_commit_hooks.insert_license_stats'} & set(sys.modules)))\n"
+        )
+        result = subprocess.run(  # nosec B603
+            [sys.executable, "-c", script],
+            check=True,
+            env=dict(os.environ, PYTHONPATH=ROOT_DIR),
+            capture_output=True,
+            text=True,
+        )
+    assert result.stdout == "[]\n"
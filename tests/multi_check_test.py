@@ -0,0 +1,147 @@
+import os
+import shutil
+
+import pytest
+
+from pre_commit_hooks.forbid_crlf import main as forbid_crlf
+from pre_commit_hooks.forbid_tabs import main as forbid_tabs
+from pre_commit_hooks.insert_license import main as insert_license
+from pre_commit_hooks.multi_check import main as multi_check
+
+from .utils import chdir_to_test_resources, capture_stdout, run_git, spy_open
+
+RESOURCES_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "resources")
+
+
+def _write_sources(tmpdir, suffix):
+    paths = []
+    for i, content in enumerate(
+        (b"foo\r\nbar\n", b"foo\tbar\n", b"foo\r\n\tbar\n", b"foo\nbar\n")
+    ):
+        path = tmpdir.join(f"{i}_{suffix}.py")
+        path.write_binary(content)
+        paths.append(path.strpath)
+    with chdir_to_test_resources():
+        for src_file_path in (
+            "module_with_license.py",
+            "module_without_license.py",
+            "main_iso8859_without_license.cpp",
+        ):
+            path = tmpdir.join(f"{suffix}_{src_file_path}")
+            shutil.copy(src_file_path, path.strpath)
+            paths.append(path.strpath)
+    return paths
+
+
+def _run(hook, argv):
+    with capture_stdout() as stdout:
+        return_code = hook(argv)
+    return return_code, stdout.getvalue()
+
+
+@pytest.mark.parametrize(
+    "checks", (("--crlf",), ("--tabs",), ("--crlf", "--tabs", "--license"))
+)
+def test_same_results_as_individual_hooks(checks, tmpdir):
+    license_args = ["--license-filepath", "LICENSE_with_trailing_newline.txt"]
+    individual_paths = _write_sources(tmpdir, "individual")
+    multi_paths = _write_sources(tmpdir, "multi")
+    with chdir_to_test_resources():
+        return_code, output = 0, ""
+        for check, hook, hook_args in (
+            ("--crlf", forbid_crlf, []),
+            ("--tabs", forbid_tabs, []),
+            ("--license", insert_license, license_args),
+        ):
+            if check in checks:
+                hook_return_code, hook_output = _run(hook, hook_args + individual_paths)
+                return_code = max(return_code, hook_return_code)
+                output += hook_output
+        multi_return_code, multi_output = _run(
+            multi_check, list(checks) + license_args + multi_paths
+        )
+    assert multi_return_code == return_code == 1
+    assert sorted(multi_output.replace("multi", "individual").splitlines()) == sorted(
+        output.splitlines()
+    )
+    for individual_path, multi_path in zip(individual_paths, multi_paths):
+        with open(individual_path, "rb") as individual_file, open(
+            multi_path, "rb"
+        ) as multi_file:
+            assert individual_file.read() == multi_file.read()
+
+
+def test_files_are_read_once(tmpdir):
+    paths = _write_sources(tmpdir, "multi")
+    with chdir_to_test_resources():
+        license_args = ["--license-filepath", "LICENSE_with_trailing_newline.txt"]
+        with spy_open() as opened_paths:
+            # Only checking files that are not modified:
+            multi_check(["--crlf", "--tabs", "--license"] + license_args + paths[4:5])
+            multi_check(["--crlf", "--tabs"] + paths)
+    assert opened_paths.count(paths[4]) == 2
+    assert [path for path in opened_paths if path != paths[4]] == [
+        "LICENSE_with_trailing_newline.txt"
+    ] + [path for path in paths if path != paths[4]]
+
+
+def test_no_check_selected():
+    with pytest.raises(SystemExit):
+        multi_check(["file.txt"])
+
+
+def test_git_rev_range(tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir.strpath)
+    run_git("init", "--quiet")
+    tmpdir.join("old.py").write_binary(b"foo\r\n")
+    run_git("add", "old.py")
+    run_git("commit", "--quiet", "-m", "initial")
+    for i, content in enumerate((b"foo\r\n", b"foo\n", b"foo\r\nbar\n")):
+        tmpdir.join("new.py").write_binary(content)
+        run_git("add", "new.py")
+        run_git("commit", "--quiet", "-m", f"change {i}")
+    tmpdir.join("new.py").remove()
+    return_code, output = _run(multi_check, ["--crlf", "--git-rev", "HEAD~3..HEAD"])
+    assert return_code == 1
+    # The CRLF end-line of old.py was committed before the range:
+    assert output.splitlines() == ["CRLF end-lines detected in file: new.py"] * 2
+    assert _run(multi_check, ["--crlf", "--git-rev", "HEAD~2..HEAD~1"]) == (0, "")
+
+
+@pytest.mark.parametrize("git_args", (("--staged",), ("--git-rev", "HEAD")))
+def test_git_objects_are_checked_without_reading_worktree(
+    git_args, tmpdir, monkeypatch
+):
+    paths = [os.path.basename(path) for path in _write_sources(tmpdir, "multi")]
+    shutil.copy(
+        os.path.join(RESOURCES_DIR, "LICENSE_with_trailing_newline.txt"),
+        tmpdir.join("LICENSE.txt").strpath,
+    )
+    monkeypatch.chdir(tmpdir.strpath)
+    run_git("init", "--quiet")
+    run_git("add", *paths)
+    run_git("commit", "--quiet", "-m", "initial")
+    for path in paths:
+        tmpdir.join(path).write_binary(b"worktree\r\n\tcontent\n")
+    with spy_open() as opened_paths:
+        # All files of the revision are checked when none is provided:
+        for filenames in ([], paths):
+            return_code, output = _run(
+                multi_check, ["--crlf", "--tabs", "--license", *git_args] + filenames
+            )
+            assert return_code == 1
+            assert sorted(output.splitlines()[:10]) == sorted(
+                [
+                    f"CRLF end-lines detected in file: {paths[0]}",
+                    f"CRLF end-lines detected in file: {paths[2]}",
+                    f"Tabs detected in file: {paths[1]}",
+                    f"Tabs detected in file: {paths[2]}",
+                ]
+                + [
+                    f"License header not found in: {path}"
+                    for path in paths
+                    if path != "multi_module_with_license.py"
+                ]
+            )
+    assert opened_paths == ["LICENSE.txt", "LICENSE.txt"]
+    assert tmpdir.join(paths[5]).read_binary() == b"worktree\r\n\tcontent\n"
@@ -1,8 +1,10 @@
+import os
 from pathlib import Path
+import sys
 
 import pytest
 
-from pre_commit_hooks.remove_crlf import main as remove_crlf
+from pre_commit_hooks.remove_crlf import main as remove_crlf, removes_crlf_in_file
 
 
 @pytest.mark.parametrize(
@@ -33,3 +35,40 @@ def test_badopt(arg):
 def test_nothing_to_fix():
     assert remove_crlf([__file__]) == 0
     assert remove_crlf(["--"]) == 0
+
+
+@pytest.mark.parametrize("chunk_size", (1, 2, 3, 4, 7, 64))
+@pytest.mark.parametrize(
+    "input_s",
+    (
+        b"foo\r\nbar",
+        b"foo\nbar\r\n",
+        b"foo\rbar\r\r\n\r",
+        b"\r\n\r\n\r\r\n",
+        b"a clean prefix\nthen\r\n",
+    ),
+)
+def test_removes_crlf_in_file(input_s, chunk_size, tmpdir):
+    input_file = Path(tmpdir.join("file.txt"))
+    input_file.write_bytes(input_s)
+    assert removes_crlf_in_file(str(input_file), chunk_size=chunk_size)
+    assert input_file.read_bytes() == input_s.replace(b"\r\n", b"\n")
+
+
+def test_removes_crlf_preserves_permissions(tmpdir):
+    input_file = Path(tmpdir.join("file.sh"))
+    input_file.write_bytes(b"#!/bin/sh\r\necho\r\n")
+    input_file.chmod(0o750)
+    assert remove_crlf([str(input_file)]) == 1
+    assert input_file.read_bytes() == b"#!/bin/sh\necho\n"
+    if sys.platform != "win32":
+        assert input_file.stat().st_mode & 0o777 == 0o750
+    assert os.listdir(tmpdir) == ["file.sh"]  # no temporary file left behind
+
+
+def test_clean_file_is_not_rewritten(tmpdir):
+    input_file = Path(tmpdir.join("file.txt"))
+    input_file.write_bytes(b"foo\rbar\n")
+    inode = input_file.stat().st_ino
+    assert not removes_crlf_in_file(str(input_file), chunk_size=4)
+    assert input_file.stat().st_ino == inode
@@ -1,6 +1,10 @@
+import os
+import random
+import sys
+
 import pytest
 
-from pre_commit_hooks.remove_tabs import main as remove_tabs
+from pre_commit_hooks.remove_tabs import main as remove_tabs, removes_tabs_in_file
 
 
 @pytest.mark.parametrize(
@@ -40,3 +44,25 @@ def test_badopt(arg):
 
 def test_nothing_to_fix():
     assert remove_tabs(["--whitespaces-count=4", __file__]) == 0
+
+
+@pytest.mark.parametrize("whitespaces_count", (0, 1, 3, 4, 8))
+@pytest.mark.parametrize("chunk_size", (1, 2, 3, 5, 64))
+def test_removes_tabs_in_file_by_chunks(whitespaces_count, chunk_size, tmpdir):
+    rand = random.Random(whitespaces_count * 100 + chunk_size)  # nosec B311
+    input_s = bytes(rand.choices(b"ab \t\t\r\n", k=500))
+    path = tmpdir.join("file.txt")
+    path.write_binary(input_s)
+    removes_tabs_in_file(path.strpath, whitespaces_count, chunk_size=chunk_size)
+    assert path.read_binary() == input_s.expandtabs(whitespaces_count)
+
+
+def test_removes_tabs_preserves_permissions(tmpdir):
+    path = tmpdir.join("file.sh")
+    path.write_binary(b"#!/bin/sh\n\techo\n")
+    os.chmod(path.strpath, 0o750)  # nosec B103
+    assert remove_tabs(("--whitespaces-count=2", path.strpath)) == 1
+    assert path.read_binary() == b"#!/bin/sh\n  echo\n"
+    if sys.platform != "win32":
+        assert os.stat(path.strpath).st_mode & 0o777 == 0o750
+    assert os.listdir(tmpdir.strpath) == ["file.sh"]
@@ -1,6 +1,8 @@
 from contextlib import contextmanager
+import builtins
 import io
 import os
+import subprocess  # nosec B404
 import sys
 
 
@@ -23,3 +25,31 @@ def capture_stdout():
         yield captured
     finally:
         sys.stdout = sys.__stdout__
+
+
+@contextmanager
+def spy_open():
+    """
+    Yields the list of the paths of the files opened with open(), completed while in this context
+    """
+    opened_paths = []
+    builtin_open = builtins.open
+
+    def recording_open(file, *args, **kwargs):
+        opened_paths.append(file)
+        return builtin_open(file, *args, **kwargs)
+
+    try:
+        builtins.open = recording_open
+        yield opened_paths
+    finally:
+        builtins.open = builtin_open
+
+
+def run_git(*args):
+    return subprocess.run(  # nosec B603
+        ("git", "-c", "user.name=test", "-c", "user.email=test@example.com") + args,
+        check=True,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    ).stdout